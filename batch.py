@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+'''
+Bulk solving of large puzzle batches with NumPy.
+
+The puzzles of a batch are an array of uint8 with one row of n*n*n*n
+digits per puzzle (0 for empty fields). Their candidates are stacked
+into one bitmask array (puzzles x fields) and naked and hidden singles
+run on all of them at once; only the puzzles which need guessing are
+passed on to the native solver one by one. Puzzles and solutions can be
+.npy files or text files with one puzzle per line, both are memory-mapped
+or written chunk by chunk, so batches may be larger than the memory;
+puzzles can also come from a puzzle store (see store.py).
+
+    python batch.py puzzles.txt -o solutions.npy
+    python batch.py puzzles.npy -o solutions.txt
+'''
+
+import os, sys, time, argparse
+import solvers, puzzles, store
+from solvers import layout
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    timer = time.perf_counter
+except AttributeError: # python 2
+    timer = time.time
+
+
+def _require():
+    if numpy is None:
+        raise RuntimeError('batch solving needs numpy')
+
+
+_units = {}
+
+def units(box):
+    '''
+    returns (units, units_of) of block size box as index arrays,
+    one row of fields per unit and the three units of every field
+    '''
+    if box not in _units:
+        L = layout(box)
+        _units[box] = (numpy.array(L.units, dtype=numpy.intp),
+                       numpy.array(L.units_of, dtype=numpy.intp))
+    return _units[box]
+
+
+def candidates(grids, box=3):
+    '''
+    returns the candidate bitmasks of the puzzles in grids
+    (puzzles x fields), bit d stands for digit d
+    '''
+    _require()
+    L = layout(box)
+    grids = numpy.asarray(grids, dtype=numpy.uint8).reshape(-1, L.cells)
+    dtype = numpy.uint16 if L.size < 16 else numpy.uint32
+    bits = numpy.array(L.bit + [0] * (256 - len(L.bit)), dtype=dtype)
+    return numpy.where(grids > 0, bits[grids], dtype(L.all))
+
+
+def propagate(cand, box=3):
+    '''
+    one round of naked and hidden singles on the stacked candidates,
+    returns (new candidates, contradiction of every puzzle)
+    '''
+    all_units, units_of = units(box)
+    size = box * box
+    full = cand.dtype.type(layout(box).all)
+
+    # naked singles: drop the digits of solved fields from their peers
+    single = cand & (cand - 1) == 0
+    solved = numpy.where(single, cand, 0)[:, all_units]
+    used = numpy.bitwise_or.reduce(solved, axis=2)
+    # the digits of a unit add up to more than their bitmask if one of
+    # them is there twice
+    failed = (solved.sum(axis=2, dtype=numpy.uint64) != used).any(axis=1)
+    taken = used[:, units_of[:, 0]] | used[:, units_of[:, 1]] | \
+        used[:, units_of[:, 2]]
+    cand = numpy.where(single, cand, cand & ~taken)
+
+    # hidden singles, rows, columns and blocks one after the other,
+    # so every field is in one unit of a group only
+    for group in range(3):
+        fields = all_units[group*size:group*size + size]
+        c = cand[:, fields]
+        once = numpy.zeros(c.shape[:2], dtype=cand.dtype)
+        twice = numpy.zeros_like(once)
+        solved = numpy.zeros_like(once)
+        for k in range(size):
+            x = c[:, :, k]
+            twice |= once & x
+            once |= x
+            solved |= numpy.where(x & (x - 1) == 0, x, 0)
+        failed |= (once != full).any(axis=1) # a digit has no place left
+        hidden = (once & ~twice & ~solved)[:, :, None] & c
+        cand[:, fields] = numpy.where(hidden != 0, hidden, c)
+
+    failed |= (cand == 0).any(axis=1)
+    return cand, failed
+
+
+def digits(cand, box=3):
+    '''
+    returns the digits of the candidates as uint8, 0 for fields
+    which still have more than one candidate
+    '''
+    single = (cand & (cand - 1) == 0) & (cand != 0)
+    # exact for powers of two
+    found = numpy.log2(numpy.where(single, cand, 1)).astype(numpy.uint8)
+    return numpy.where(single, found, 0).astype(numpy.uint8)
+
+
+def solveArray(grids, box=3, solver=None):
+    '''
+    solves the puzzles of grids (puzzles x fields, or puzzles x rows x
+    columns) and returns (solutions, solved, guessed): solutions as uint8
+    array of puzzles x fields, all 0 where the bool array solved is False,
+    and the number of puzzles left for the solver after propagation
+    '''
+    _require()
+    solver = solver or solvers.NativeSolver()
+    L = layout(box)
+    grids = numpy.asarray(grids, dtype=numpy.uint8).reshape(-1, L.cells)
+    cand = candidates(grids, box)
+    failed = (grids > L.size).any(axis=1)
+
+    # propagate until nothing changes, puzzles which are solved, stuck
+    # or contradictory drop out of the working set
+    active = numpy.flatnonzero(~failed)
+    while len(active):
+        before = cand[active]
+        after, wrong = propagate(before.copy(), box)
+        cand[active] = after
+        failed[active] |= wrong
+        done = wrong | (after & (after - 1) == 0).all(axis=1) | \
+            (after == before).all(axis=1)
+        active = active[~done]
+
+    # the last round may have left a digit twice in a unit, a solution
+    # has every digit once in every unit
+    single = (cand & (cand - 1) == 0).all(axis=1)
+    all_units = units(box)[0]
+    full = cand.dtype.type(L.all)
+    failed |= single & (numpy.bitwise_or.reduce(cand[:, all_units], axis=2)
+                        != full).any(axis=1)
+
+    solutions = digits(cand, box)
+    solutions[failed] = 0
+    solved = ~failed & (solutions != 0).all(axis=1)
+
+    # the rest needs guessing, the fields propagation found are givens
+    rest = numpy.flatnonzero(~failed & ~solved)
+    size = L.size
+    for i in rest:
+        grid = solutions[i].reshape(size, size).tolist()
+        solution = solver.solve(grid)
+        if solution is None:
+            solutions[i] = 0
+        else:
+            solutions[i] = numpy.array(solution, dtype=numpy.uint8).ravel()
+            solved[i] = True
+    return solutions, solved, len(rest)
+
+
+def solvedChunks(grids, box=3, chunk=4096, solver=None):
+    '''
+    solves grids chunk by chunk, so only one chunk is in memory at a
+    time, and yields (start, solutions, solved, guessed) of every chunk
+    like solveArray() returns them
+    '''
+    solver = solver or solvers.NativeSolver()
+    for start in range(0, len(grids), chunk):
+        solutions, ok, rest = solveArray(grids[start:start + chunk], box,
+                                         solver)
+        yield start, solutions, ok, rest
+
+
+def solveChunks(grids, out, box=3, chunk=4096, solver=None):
+    '''
+    solves grids chunk by chunk into out (e.g. both memory-mapped),
+    returns (solved, guessed) counts
+    '''
+    solved = guessed = 0
+    for start, solutions, ok, rest in solvedChunks(grids, box, chunk, solver):
+        out[start:start + len(solutions)] = solutions.reshape(
+            out[start:start + len(solutions)].shape)
+        solved += int(ok.sum())
+        guessed += rest
+    return solved, guessed
+
+
+def _table(box):
+    '''
+    returns the digit of every character (255 for no digit)
+    '''
+    table = numpy.full(256, 255, dtype=numpy.uint8)
+    for ch in puzzles.EMPTY:
+        table[ord(ch)] = 0
+    for d, ch in enumerate(puzzles.DIGITS[:box * box], 1):
+        table[ord(ch)] = table[ord(ch.lower())] = d
+    return table
+
+
+class TextPuzzles(object):
+    '''
+    The puzzles of a memory-mapped text file with one puzzle per line
+    and nothing else; texts[a:b] converts the lines a to b into a uint8
+    array (puzzles x fields), so only that slice is in memory.
+    '''
+    def __init__(self, path, box=3):
+        self.box = box
+        self.cells = layout(box).cells
+        self.width = self.cells + 1 # with the newline
+        self.data = numpy.memmap(path, dtype=numpy.uint8, mode='r')
+        # the last line may lack its newline
+        self.count = (len(self.data) + 1) // self.width
+        self.table = _table(box)
+
+    def __len__(self):
+        return self.count
+
+    def lines(self, start, stop):
+        '''
+        returns the lines start to stop as array, newlines included
+        '''
+        data = self.data[start * self.width:stop * self.width]
+        if len(data) % self.width:
+            data = numpy.append(data, numpy.uint8(ord('\n')))
+        return data.reshape(-1, self.width)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.count)
+            if step != 1:
+                raise ValueError('only slices with step 1')
+            return self.table[self.lines(start, stop)[:, :-1]]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('puzzle %d of %d' % (index, self.count))
+        return self.table[self.lines(index, index + 1)[0, :-1]]
+
+    def check(self, chunk=65536):
+        '''
+        returns True when the file holds one puzzle per line and nothing
+        else, reading it chunk by chunk
+        '''
+        if len(self.data) % self.width not in (0, self.cells):
+            return False
+        for start in range(0, self.count, chunk):
+            lines = self.lines(start, start + chunk)
+            if (lines[:, -1] != ord('\n')).any() or \
+                    (self.table[lines[:, :-1]] == 255).any():
+                return False
+        return True
+
+
+def loadText(path, box=3):
+    '''
+    returns the puzzles of a text file: files of one puzzle per line and
+    nothing else as TextPuzzles, which converts them slice by slice, all
+    others are read line by line into a uint8 array (puzzles x fields)
+    '''
+    _require()
+    cells = layout(box).cells
+    if not path.endswith('.gz') and path != '-' and os.path.getsize(path):
+        texts = TextPuzzles(path, box)
+        if texts.check():
+            return texts
+
+    rows = []
+    for number, grid in puzzles.readPuzzles(puzzles.openPuzzles(path)):
+        if isinstance(grid, ValueError):
+            raise ValueError('line %d: %s' % (number, grid))
+        if len(grid) != box * box:
+            raise ValueError('line %d: not a puzzle of block size %d'
+                             % (number, box))
+        rows.append([d for row in grid for d in row])
+    return numpy.array(rows, dtype=numpy.uint8).reshape(-1, cells)
+
+
+def saveText(path, grids, solved=None):
+    '''
+    writes grids as one line each, 'none' for those not solved
+    '''
+    file = open(path, 'wb')
+    writeText(file, grids, solved)
+    file.close()
+
+
+def writeText(file, grids, solved=None):
+    '''
+    writes grids to the binary file as one line each,
+    'none' for those not solved
+    '''
+    _require()
+    grids = numpy.asarray(grids, dtype=numpy.uint8).reshape(len(grids), -1)
+    chars = numpy.frombuffer(('.' + puzzles.DIGITS).encode('ascii'),
+                             dtype=numpy.uint8)
+    lines = numpy.empty((len(grids), grids.shape[1] + 1), dtype=numpy.uint8)
+    lines[:, :-1] = chars[grids]
+    lines[:, -1] = ord('\n')
+    missing = [] if solved is None else numpy.flatnonzero(~solved)
+
+    start = 0
+    for i in missing:
+        file.write(lines[start:i].tobytes())
+        file.write(b'none\n')
+        start = i + 1
+    file.write(lines[start:].tobytes())
+
+
+def load(path, box=3):
+    '''
+    returns the puzzles of a .npy file (memory-mapped), a puzzle store
+    (.sdb, sliced chunk by chunk, close it when done) or a text file
+    (see loadText())
+    '''
+    if path.endswith('.sdb'):
+        grids = store.PuzzleStore(path)
+        if grids.box != box:
+            raise ValueError('the store holds puzzles of block size %d'
+                             % grids.box)
+        return grids
+    if path.endswith('.npy'):
+        grids = numpy.load(path, mmap_mode='r')
+        return grids.reshape(len(grids), -1)
+    return loadText(path, box)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Solves large batches of '
+        'Sudoku puzzles with NumPy.')
+    parser.add_argument('file', help='puzzles, .npy, .sdb or one per line')
+    parser.add_argument('-o', '--output', required=True,
+        help='solutions, .npy (all 0 for no solution) or text')
+    parser.add_argument('-b', '--box', type=int, default=3,
+        help='block size, 3 for 9x9, 4 for 16x16, 5 for 25x25')
+    parser.add_argument('--chunk', type=int, default=4096,
+        help='puzzles solved at once')
+    parser.add_argument('-q', '--quiet', action='store_true',
+        help='no summary on stderr')
+    args = parser.parse_args(argv)
+    if numpy is None:
+        parser.error('batch solving needs numpy')
+
+    start = timer()
+    try:
+        grids = load(args.file, args.box)
+    except ValueError as error:
+        sys.stderr.write('%s: %s\n' % (args.file, error))
+        return 1
+    cells = layout(args.box).cells
+    if args.output.endswith('.npy'):
+        out = numpy.lib.format.open_memmap(args.output, mode='w+',
+            dtype=numpy.uint8, shape=(len(grids), cells))
+        solved, guessed = solveChunks(grids, out, args.box, args.chunk)
+        out.flush()
+        del out
+    else:
+        # written chunk by chunk, like the input is read
+        out = open(args.output, 'wb')
+        solved = guessed = 0
+        for first, solutions, ok, rest in solvedChunks(grids, args.box,
+                                                       args.chunk):
+            writeText(out, solutions, ok)
+            solved += int(ok.sum())
+            guessed += rest
+        out.close()
+    if isinstance(grids, store.PuzzleStore):
+        grids.close()
+    seconds = timer() - start
+
+    if not args.quiet:
+        sys.stderr.write('%d puzzles, %d solved (%d needed guessing) '
+            'in %.2fs, %.1f/s\n' % (len(grids), solved, guessed, seconds,
+            len(grids) / seconds if seconds else 0))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
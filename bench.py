@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the solver backends over the puzzle corpora in corpora/.
+
+For every backend and corpus it reports puzzles/sec, p50/p99 latency,
+search nodes (where the backend counts them) and the peak memory
+allocated by Python while solving, and it checks every solution. It
+fails when a solution is wrong or a puzzle takes longer than --timeout,
+corpora/25x25.txt keeps the large boards from getting slow again.
+
+    python bench.py                          # all available backends
+    python bench.py -c 25x25 -t 30
+    python bench.py -s native -o HEAD.json   # save the results
+    python bench.py --compare old.json new.json
+'''
+
+import sys, os, glob, json, time, platform, argparse, subprocess
+import solvers, puzzles
+
+try:
+    import tracemalloc
+except ImportError: # python 2
+    tracemalloc = None
+
+try:
+    timer = time.perf_counter
+except AttributeError: # python 2
+    timer = time.time
+
+CORPORA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpora')
+
+
+def loadCorpus(path):
+    '''
+    returns the grids of a corpus file
+    '''
+    file = open(path)
+    grids = [grid for number, grid in puzzles.readPuzzles(file)
+             if not isinstance(grid, ValueError)]
+    file.close()
+    return grids
+
+
+def checkSolution(grid, solution):
+    '''
+    returns True when solution is complete, valid and keeps the givens
+    '''
+    cells = [d for row in solution for d in row]
+    if len(solution) != len(grid) or \
+            any(g and g != s for row, srow in zip(grid, solution)
+                for g, s in zip(row, srow)):
+        return False
+    L = solvers.layout(solvers.boxSize(grid))
+    digits = list(range(1, L.size + 1))
+    return all(sorted(cells[i] for i in unit) == digits for unit in L.units)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+
+
+def benchmark(solver, grids, repeat=1):
+    '''
+    solves all grids repeat times and returns the measurements
+    '''
+    latencies = []
+    nodes = []
+    unsolvable = wrong = timeouts = 0
+    start = timer()
+    for r in range(repeat):
+        for grid in grids:
+            t = timer()
+            try:
+                solution = solver.solve(grid)
+            except solvers.SolverTimeout:
+                latencies.append(timer() - t)
+                timeouts += 1
+                continue
+            latencies.append(timer() - t)
+            if 'nodes' in solver.counted:
+                nodes.append(solver.nodes)
+            if solution is None:
+                unsolvable += 1
+            elif not checkSolution(grid, solution):
+                wrong += 1
+    total = timer() - start
+
+    result = {
+        'puzzles': len(latencies),
+        'seconds': total,
+        'puzzles_per_sec': len(latencies) / total if total else None,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': max(latencies) * 1000,
+        'unsolvable': unsolvable // repeat,
+        'wrong': wrong // repeat,
+        'timeouts': timeouts,
+        'nodes_total': sum(nodes) if nodes else None,
+        'nodes_max': max(nodes) if nodes else None,
+        'peak_kb': None,
+    }
+
+    # a second pass for the memory, tracemalloc slows the solvers down
+    if tracemalloc is not None:
+        tracemalloc.start()
+        for grid in grids:
+            try:
+                solver.solve(grid)
+            except solvers.SolverTimeout:
+                pass
+        result['peak_kb'] = tracemalloc.get_traced_memory()[1] / 1024.0
+        tracemalloc.stop()
+    return result
+
+
+def metadata():
+    '''
+    returns where and on which commit the benchmark ran
+    '''
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=open(os.devnull, 'w')).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def compare(old, new, out=sys.stdout):
+    '''
+    prints the change of puzzles/sec and p99 for every measurement in both
+    result files, returns the number of measurements that got slower by
+    more than 10%
+    '''
+    slower = 0
+    out.write('%-14s %-14s %12s %12s %8s %8s\n' % ('solver', 'corpus',
+              'old/s', 'new/s', 'speed', 'p99'))
+    for key in sorted(set(old['results']) & set(new['results'])):
+        a, b = old['results'][key], new['results'][key]
+        speed = b['puzzles_per_sec'] / a['puzzles_per_sec']
+        p99 = b['p99_ms'] / a['p99_ms'] if a['p99_ms'] else float('nan')
+        if speed < 0.9:
+            slower += 1
+        out.write('%-14s %-14s %12.1f %12.1f %7.2fx %7.2fx\n' % (tuple(
+                  key.split('/')) + (a['puzzles_per_sec'],
+                  b['puzzles_per_sec'], speed, p99)))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the Sudoku '
+        'solver backends.')
+    parser.add_argument('-s', '--solver', action='append',
+        choices=sorted(solvers.SOLVERS),
+        help='backend to measure, can be repeated, default all available')
+    parser.add_argument('-c', '--corpus', action='append',
+        help='corpus name in corpora/ or puzzle file, default all')
+    parser.add_argument('-r', '--repeat', type=int, default=1,
+        help='solve every corpus this many times')
+    parser.add_argument('-t', '--timeout', type=float, default=60.0,
+        help='seconds a puzzle may take, default 60')
+    parser.add_argument('-o', '--output', help='write the results as JSON')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+        help='compare two result files instead of measuring')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        old, new = [json.load(open(name)) for name in args.compare]
+        return 1 if compare(old, new) else 0
+
+    names = args.solver or sorted(solvers.SOLVERS)
+    backends = [solvers.getSolver(name) for name in names
+                if solvers.SOLVERS[name].available()]
+    for solver in backends:
+        solver.timeout = args.timeout
+
+    corpora = args.corpus or sorted(os.path.basename(path)[:-4] for path in
+                                    glob.glob(os.path.join(CORPORA, '*.txt')))
+
+    results = {}
+    failed = 0
+    sys.stdout.write('%-14s %-14s %8s %10s %9s %9s %10s %9s\n' % ('solver',
+        'corpus', 'puzzles', 'puzzles/s', 'p50 ms', 'p99 ms', 'nodes', 'peak kB'))
+    for solver in backends:
+        for corpus in corpora:
+            path = corpus if os.path.exists(corpus) else \
+                os.path.join(CORPORA, corpus + '.txt')
+            name = os.path.basename(path).rsplit('.', 1)[0]
+            result = benchmark(solver, loadCorpus(path), args.repeat)
+            results[solver.name + '/' + name] = result
+            sys.stdout.write('%-14s %-14s %8d %10.1f %9.2f %9.2f %10s %9s\n' % (
+                solver.name, name, result['puzzles'],
+                result['puzzles_per_sec'], result['p50_ms'], result['p99_ms'],
+                result['nodes_total'] if result['nodes_total'] is not None
+                else '-', '%.0f' % result['peak_kb']
+                if result['peak_kb'] is not None else '-'))
+            if result['wrong']:
+                sys.stdout.write('  %d wrong solutions!\n' % result['wrong'])
+            if result['timeouts']:
+                sys.stdout.write('  %d puzzles took longer than %gs!\n' % (
+                    result['timeouts'], args.timeout))
+            failed += result['wrong'] + result['timeouts']
+        if hasattr(solver, 'close'):
+            solver.close()
+
+    if args.output:
+        file = open(args.output, 'w')
+        json.dump({'meta': metadata(), 'results': results}, file,
+                  indent=2, sort_keys=True)
+        file.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
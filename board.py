@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+'''
+The state of a Sudoku field, independent of any widgets.
+'''
+
+from solvers import layout, boxSize
+
+
+class Board(object):
+    '''
+    The digits of all fields in a bytearray (0 for empty fields) and a
+    flag for every field filled in by the solver. For every row, column
+    and block the count of each digit and the bitmask of the used digits
+    are kept up to date on every change, so a change costs O(1), and so
+    does asking for the candidates or conflicts of a field.
+    The block size box is 3 for 9x9 boards, 4 for 16x16 and so on,
+    a grid passed in brings its own.
+    '''
+    __slots__ = ('layout', 'size', 'cells', 'calculated', 'counts', 'used',
+                 'filled', 'clashes')
+
+    def __init__(self, grid=None, box=3):
+        if grid is not None:
+            box = boxSize(grid)
+        self.layout = layout(box)
+        self.size = self.layout.size
+        self.cells = bytearray(self.layout.cells)
+        self.calculated = bytearray(self.layout.cells)
+        units = len(self.layout.units)
+        # counts[unit*(size + 1) + digit]
+        self.counts = bytearray(units * (self.size + 1))
+        self.used = [0] * units # bitmask of the digits in a unit
+        self.filled = 0
+        self.clashes = 0 # digits more than once in a unit, summed up
+        if grid is not None:
+            self.load(grid)
+
+    def get(self, row, col):
+        return self.cells[row*self.size + col]
+
+    def set(self, row, col, digit, calculated=False):
+        '''
+        sets the field to digit (0 clears it),
+        returns True when the field changed
+        '''
+        i = row*self.size + col
+        old = self.cells[i]
+        self.calculated[i] = calculated and digit != 0
+        if old == digit:
+            return False
+
+        counts = self.counts
+        stride = self.size + 1
+        bit = self.layout.bit
+        for unit in self.layout.units_of[i]:
+            if old:
+                counts[unit*stride + old] -= 1
+                if counts[unit*stride + old]:
+                    self.clashes -= 1
+                else:
+                    self.used[unit] &= ~bit[old]
+            if digit:
+                if counts[unit*stride + digit]:
+                    self.clashes += 1
+                counts[unit*stride + digit] += 1
+                self.used[unit] |= bit[digit]
+
+        self.filled += (digit != 0) - (old != 0)
+        self.cells[i] = digit
+        return True
+
+    def candidates(self, row, col):
+        '''
+        returns the bitmask of digits not used in the row,
+        column and block of the field
+        '''
+        r, c, b = self.layout.units_of[row*self.size + col]
+        return self.layout.all & ~(self.used[r] | self.used[c] | self.used[b])
+
+    def conflicts(self, row, col):
+        '''
+        returns True when the digit of the field is in its row,
+        column or block once more
+        '''
+        i = row*self.size + col
+        digit = self.cells[i]
+        if not digit:
+            return False
+        stride = self.size + 1
+        return any(self.counts[unit*stride + digit] > 1
+                   for unit in self.layout.units_of[i])
+
+    def hasConflicts(self):
+        '''
+        returns True when any digit is twice in a row, column or block
+        '''
+        return self.clashes > 0
+
+    def isFull(self):
+        return self.filled == self.layout.cells
+
+    def firstEmpty(self):
+        '''
+        returns the index of the first empty field or -1
+        '''
+        return self.cells.find(b'\x00')
+
+    def lastCalculated(self):
+        '''
+        returns the index of the last field filled in by the solver or -1
+        '''
+        return self.calculated.rfind(b'\x01')
+
+    def grid(self):
+        '''
+        returns the board as a list of rows
+        '''
+        size = self.size
+        return [list(self.cells[r*size:r*size + size]) for r in range(size)]
+
+    def load(self, grid):
+        '''
+        replaces the board with grid, returns the indices of changed fields
+        '''
+        changed = []
+        size = self.size
+        for r in range(size):
+            for c in range(size):
+                if self.set(r, c, grid[r][c]):
+                    changed.append(r*size + c)
+        return changed
+
+    def fill(self, solution):
+        '''
+        fills all empty fields from solution and marks them as calculated,
+        returns the indices of the filled fields
+        '''
+        changed = []
+        size = self.size
+        i = self.cells.find(b'\x00')
+        while i >= 0:
+            self.set(i // size, i % size, solution[i // size][i % size], True)
+            changed.append(i)
+            i = self.cells.find(b'\x00', i + 1)
+        return changed
+
+    def clear(self):
+        '''
+        empties the board, returns the indices of the fields that were set
+        '''
+        changed = [i for i in range(len(self.cells)) if self.cells[i]]
+        self.cells[:] = bytearray(len(self.cells))
+        self.calculated[:] = bytearray(len(self.cells))
+        self.counts[:] = bytearray(len(self.counts))
+        self.used = [0] * len(self.used)
+        self.filled = 0
+        self.clashes = 0
+        return changed
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+'''
+A bounded LRU cache of solutions in front of a solver backend.
+
+Puzzles are keyed by a canonical form which is the same for all puzzles
+that only differ by relabeling the digits, permuting rows within a band,
+bands, columns within a stack, stacks, or by transposition. A cached
+solution is mapped back to the orientation of the asking puzzle.
+'''
+
+import os, sys, itertools
+from collections import OrderedDict
+from solvers import Solver
+
+PERMS3 = list(itertools.permutations(range(3)))
+
+# search states allowed per stage before giving up on a (very sparse or
+# very symmetric) puzzle, such a puzzle is simply not cached
+MAX_STATES = 20000
+
+
+class Transform(object):
+    '''
+    Maps a puzzle to its canonical form and back:
+    canonical[i][j] = labels[grid[rows[i]][columns[j]]] (grid transposed first
+    if transposed is set)
+    '''
+    __slots__ = ('transposed', 'rows', 'columns', 'labels')
+
+    def __init__(self, transposed, rows, columns, labels):
+        self.transposed = transposed
+        self.rows = rows
+        self.columns = columns
+        self.labels = labels # list, labels[digit] = canonical digit
+
+    def forward(self, grid):
+        '''
+        returns grid in canonical orientation as a flat bytearray
+        '''
+        if self.transposed:
+            grid = [list(column) for column in zip(*grid)]
+        labels = self.labels
+        return bytearray(labels[grid[r][c]]
+                         for r in self.rows for c in self.columns)
+
+    def backward(self, cells):
+        '''
+        returns the grid of rows in the original orientation
+        for the flat canonical cells
+        '''
+        inverse = [0] * 10
+        for digit, label in enumerate(self.labels):
+            inverse[label] = digit
+        grid = [[0] * 9 for r in range(9)]
+        for i, r in enumerate(self.rows):
+            for j, c in enumerate(self.columns):
+                grid[r][c] = inverse[cells[i*9 + j]]
+        if self.transposed:
+            grid = [list(column) for column in zip(*grid)]
+        return grid
+
+
+def _nextRows(chosen):
+    '''
+    returns the rows which may follow the chosen ones
+    without tearing a band apart
+    '''
+    if len(chosen) % 3:
+        band = chosen[-1] // 3
+        return [r for r in range(band*3, band*3 + 3) if r not in chosen]
+    bands = set(r // 3 for r in chosen)
+    return [r for r in range(9) if r // 3 not in bands]
+
+
+def _smallestOrders(row):
+    '''
+    returns all column orders which turn the given fields of row
+    into the smallest pattern
+    '''
+    given = [[c for c in range(s*3, s*3 + 3) if row[c]] for s in range(3)]
+    empty = [[c for c in range(s*3, s*3 + 3) if not row[c]] for s in range(3)]
+    orders = []
+    for stacks in PERMS3:
+        counts = [len(given[s]) for s in stacks]
+        if counts != sorted(counts):
+            continue
+        parts = [[e + g for e in itertools.permutations(empty[s])
+                  for g in itertools.permutations(given[s])] for s in stacks]
+        orders.extend(a + b + c for a in parts[0] for b in parts[1]
+                      for c in parts[2])
+    return orders
+
+
+def canonicalize(grid):
+    '''
+    returns (key, transform) of the puzzle, key is the canonical puzzle
+    as bytes, returns (None, None) if the search would get too expensive
+    and for boards other than 9x9
+    '''
+    if len(grid) != 9:
+        return None, None
+    grids = (grid, [list(column) for column in zip(*grid)])
+
+    # 1. find all orientations with the smallest pattern of given fields,
+    # row by row, each row is a 9 bit number with the first column on top
+    bits = [[sum(1 << (8 - c) for c in range(9) if g[r][c]) for r in range(9)]
+            for g in grids]
+    # the smallest first row a row can become: stacks with fewer given
+    # fields first, the given fields of a stack at its end
+    def smallest(value):
+        counts = sorted(bin(value >> s & 7).count('1') for s in (0, 3, 6))
+        return ((1 << counts[0]) - 1) << 6 | ((1 << counts[1]) - 1) << 3 | \
+               ((1 << counts[2]) - 1)
+    first = min(smallest(v) for b in bits for v in b)
+    states = [(t, (r,), columns) for t in (0, 1) for r in range(9)
+              if smallest(bits[t][r]) == first
+              for columns in _smallestOrders(grids[t][r])]
+    for k in range(1, 9):
+        best = None
+        survivors = []
+        for t, rows, columns in states:
+            for r in _nextRows(rows):
+                row = grids[t][r]
+                value = 0
+                for c in columns:
+                    value = value << 1 | (row[c] != 0)
+                if best is None or value < best:
+                    best = value
+                    survivors = []
+                if value == best:
+                    survivors.append((t, rows + (r,), columns))
+        if len(survivors) > MAX_STATES:
+            return None, None
+        states = survivors
+
+    # 2. among those take the one with the smallest relabeled digits
+    best = None
+    for t, rows, columns in states:
+        g = grids[t]
+        labels = [0] * 10
+        label = 1
+        cells = []
+        for r in rows:
+            row = g[r]
+            for c in columns:
+                d = row[c]
+                if d and not labels[d]:
+                    labels[d] = label
+                    label += 1
+                cells.append(labels[d])
+        if best is None or cells < best[0]:
+            best = (cells, t, rows, columns, labels)
+
+    cells, t, rows, columns, labels = best
+    # digits missing in the puzzle get the remaining labels
+    unused = [d for d in range(1, 10) if d not in labels]
+    for d in range(1, 10):
+        if not labels[d]:
+            labels[d] = unused.pop(0)
+    return bytes(bytearray(cells)), Transform(t, rows, columns, labels)
+
+
+class SolutionCache(object):
+    '''
+    LRU cache from canonical puzzles to canonical solutions, bounded by
+    an estimate of its memory use. With a path the entries are loaded
+    from and saved to a file, so they survive restarts.
+    '''
+    ENTRY_SIZE = 2 * sys.getsizeof(b'x' * 81) + 100 # key, value, dict slot
+
+    def __init__(self, max_bytes=8 << 20, path=None):
+        self.max_entries = max(1, max_bytes // self.ENTRY_SIZE)
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        '''
+        returns the cached solution (b'' for no solution) or None
+        '''
+        value = self.entries.pop(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries[key] = value # most recently used last
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def load(self):
+        '''
+        reads the entries of self.path, one 'puzzle solution' per line
+        '''
+        file = open(self.path)
+        for line in file:
+            parts = line.split()
+            if len(parts) == 2 and len(parts[0]) == 81:
+                value = b'' if parts[1] == '-' else _unpack(parts[1])
+                self.put(_unpack(parts[0]), value)
+        file.close()
+
+    def save(self):
+        '''
+        writes all entries to self.path, least recently used first
+        '''
+        if self.path is None:
+            return
+        temp = self.path + '.tmp'
+        file = open(temp, 'w')
+        for key, value in self.entries.items():
+            file.write('%s %s\n' % (_pack(key), _pack(value) if value else '-'))
+        file.close()
+        os.rename(temp, self.path)
+
+
+def _pack(cells):
+    return ''.join(str(d) for d in bytearray(cells))
+
+def _unpack(text):
+    return bytes(bytearray(int(ch) for ch in text))
+
+
+class CachedSolver(Solver):
+    '''
+    Asks the cache before the wrapped solver and stores its results,
+    puzzles without solution are cached as well.
+    '''
+    def __init__(self, solver, cache=None):
+        self.solver = solver
+        self.name = solver.name
+        self.counted = solver.counted
+        self.cache = cache if cache is not None else SolutionCache()
+
+    def available(self):
+        return self.solver.available()
+
+    def solve(self, grid):
+        self._takeCounters(None) # a cache hit costs nothing
+        key, transform = canonicalize(grid)
+        if key is None:
+            solution = self.solver.solve(grid)
+            self._takeCounters(self.solver)
+            return solution
+
+        value = self.cache.get(key)
+        if value is not None:
+            return transform.backward(bytearray(value)) if value else None
+
+        solution = self.solver.solve(grid)
+        self._takeCounters(self.solver)
+        if solution is None:
+            self.cache.put(key, b'')
+        else:
+            self.cache.put(key, bytes(transform.forward(solution)))
+        return solution
+
+    def cancel(self):
+        self.solver.cancel()
+
+    def close(self):
+        self.cache.save()
+        if hasattr(self.solver, 'close'):
+            self.solver.close()
+
+    def _takeCounters(self, solver):
+        '''
+        reports the counters of solver's latest search as its own,
+        with None the ones of no search at all
+        '''
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(solver or Solver, name))
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+'''
+Headless batch solving, no PyQt4 needed.
+
+Reads puzzles (81 characters per line, 256 for 16x16) from files or stdin
+and writes one line per puzzle: the solution, 'none' when the puzzle has
+no solution, 'invalid' when the line is no puzzle, 'timeout' or 'error'
+when the solver failed on it; the reason goes to stderr.
+
+    python cli.py puzzles.txt > solutions.txt
+    cat puzzles.txt | python cli.py -s prolog-pool
+    python cli.py -j 0 corpus.txt.gz > solutions.txt
+'''
+
+import sys, json, argparse, multiprocessing, threading
+import solvers, puzzles, cache, stats
+
+SOLVED, NONE, INVALID = 'solved', 'none', 'invalid'
+TIMEOUT, ERROR = 'timeout', 'error' # the solver failed
+
+# the solver of a worker process
+_solver = None
+
+
+def solveLine(solver, line):
+    '''
+    solves the puzzle in line and returns (kind, text), kind is one of
+    SOLVED, NONE, INVALID, TIMEOUT and ERROR and text the solution or the
+    error message, returns None for blank and comment lines
+    '''
+    try:
+        grid = puzzles.parsePuzzle(line)
+    except ValueError as error:
+        return INVALID, str(error)
+    if grid is None:
+        return None
+    try:
+        solution = solver.solve(grid)
+    except solvers.SolverTimeout as error:
+        return TIMEOUT, str(error)
+    except (EOFError, ValueError, IOError, OSError) as error:
+        return ERROR, str(error) or error.__class__.__name__
+    if solution is None:
+        return NONE, None
+    return SOLVED, puzzles.formatGrid(solution)
+
+
+def makeSolver(name, cached=False, cache_file=None, cache_size=8):
+    '''
+    returns the solver backend name, with cached set wrapped
+    in a solution cache of cache_size MB
+    '''
+    solver = solvers.getSolver(name)
+    if cached or cache_file:
+        solver = cache.CachedSolver(solver,
+            cache.SolutionCache(cache_size << 20, cache_file))
+    return solver
+
+
+def _initWorker(name, cached, cache_size):
+    global _solver
+    _solver = makeSolver(name, cached, cache_size=cache_size)
+
+
+def _solveInWorker(line):
+    return solveLine(_solver, line)
+
+
+def _bounded(lines, slots):
+    '''
+    yields from lines but waits for a free slot first, so the pool
+    never reads more of the input than it has results to hand out
+    '''
+    for line in lines:
+        slots.acquire()
+        yield line
+
+
+def solveStream(solver, file, out, errors=sys.stderr, pool=None, chunksize=64,
+                backlog=64, stats_out=None):
+    '''
+    solves the puzzles of file and writes the results to out,
+    with a process pool the puzzles are sent in chunks of chunksize
+    and results are still written in input order; with stats_out
+    (and an InstrumentedSolver, no pool) the stats of every puzzle
+    are written there as one JSON object per line
+    returns the number of (solved, unsolvable, invalid, failed) puzzles
+    '''
+    counts = {SOLVED: 0, NONE: 0, INVALID: 0, TIMEOUT: 0, ERROR: 0}
+
+    if pool is None:
+        results = (solveLine(solver, line) for line in file)
+        release = lambda: None
+    else:
+        slots = threading.Semaphore(backlog * chunksize)
+        results = pool.imap(_solveInWorker, _bounded(file, slots), chunksize)
+        release = slots.release
+
+    for number, result in enumerate(results, 1):
+        release()
+        if result is None:
+            continue
+        kind, text = result
+        counts[kind] += 1
+        if stats_out is not None and kind != INVALID:
+            record = solver.last.asDict()
+            record['line'] = number
+            stats_out.write(json.dumps(record, sort_keys=True) + '\n')
+        if kind == SOLVED:
+            out.write(text + '\n')
+        else:
+            if kind == INVALID:
+                errors.write('line %d: %s\n' % (number, text))
+            elif kind != NONE:
+                errors.write('line %d: %s: %s\n' % (number, kind, text))
+            out.write(kind + '\n')
+
+    return counts[SOLVED], counts[NONE], counts[INVALID], \
+        counts[TIMEOUT] + counts[ERROR]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Solves Sudoku puzzles '
+        'given as 81 (or 16, 256, 625) characters per line.')
+    parser.add_argument('files', nargs='*', default=['-'],
+        help='puzzle files, - or nothing for stdin, .gz is supported')
+    parser.add_argument('-s', '--solver', default='native',
+        choices=sorted(solvers.SOLVERS), help='solver backend')
+    parser.add_argument('-o', '--output', default='-',
+        help='file for the solutions, - for stdout')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+        help='number of worker processes, 0 for one per core')
+    parser.add_argument('--chunksize', type=int, default=64,
+        help='puzzles sent to a worker at once')
+    parser.add_argument('--cache', action='store_true',
+        help='cache solutions, equivalent puzzles are only solved once')
+    parser.add_argument('--cache-file',
+        help='cache file, loaded at start and saved at the end')
+    parser.add_argument('--cache-size', type=int, default=8,
+        help='memory limit of the cache in MB')
+    parser.add_argument('--stats',
+        help='file for the stats of every puzzle as JSON lines, '
+             'the last line has the totals')
+    parser.add_argument('--profile',
+        help='file for a cProfile profile of the solves (pstats format)')
+    parser.add_argument('-q', '--quiet', action='store_true',
+        help='no summary on stderr')
+    args = parser.parse_args(argv)
+
+    if not solvers.SOLVERS[args.solver].available():
+        parser.error('solver %s is not available here' % args.solver)
+    solver = makeSolver(args.solver, args.cache, args.cache_file,
+                        args.cache_size)
+    if args.stats or args.profile:
+        solver = stats.InstrumentedSolver(solver, bool(args.profile))
+
+    pool = None
+    if args.jobs != 1:
+        if args.cache_file:
+            parser.error('--cache-file only works without -j')
+        if args.stats or args.profile:
+            parser.error('--stats and --profile only work without -j')
+        jobs = args.jobs if args.jobs > 0 else multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(jobs, _initWorker,
+                                    (args.solver, args.cache, args.cache_size))
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    stats_out = open(args.stats, 'w') if args.stats else None
+    total = [0, 0, 0, 0]
+    try:
+        for name in args.files:
+            file = puzzles.openPuzzles(name)
+            try:
+                counts = solveStream(solver, file, out, pool=pool,
+                                     chunksize=args.chunksize,
+                                     stats_out=stats_out)
+            finally:
+                if file is not sys.stdin:
+                    file.close()
+            total = [a + b for a, b in zip(total, counts)]
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if pool is not None:
+            pool.terminate()
+        if args.cache_file:
+            solver.close()
+        if stats_out is not None:
+            stats_out.write(json.dumps({'total': solver.total.asDict()},
+                                       sort_keys=True) + '\n')
+            stats_out.close()
+        if args.profile:
+            solver.dumpProfile(args.profile)
+
+    if not args.quiet:
+        if args.stats or args.profile:
+            sys.stderr.write(solver.total.summary() + '\n')
+        sys.stderr.write('%d solved, %d without solution, %d invalid, '
+                         '%d failed\n' % tuple(total))
+    return 0 if total[1] == total[2] == total[3] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+'''
+Generator for uniquely solvable puzzles of a given difficulty.
+
+    python generator.py -d hard -n 100 > hard.txt
+    python generator.py -d hard -n 1000 -v 20 > hard.txt
+'''
+
+import sys, time, random, argparse, threading
+import solvers, puzzles
+from solvers import layout, boxSize
+
+try:
+    import queue
+except ImportError: # python 2
+    import Queue as queue
+
+# easy:   naked singles alone solve it
+# medium: naked and hidden singles solve it
+# hard:   it needs guessing
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+# easy puzzles keep some more givens than they would need,
+# a share of all fields, e.g. 32 of 81
+MIN_CLUES = {'easy': 0.4, 'medium': 0, 'hard': 0}
+
+
+def difficulties(box):
+    '''
+    returns the difficulties of block size box which can be generated:
+    naked singles solve (almost) every uniquely solvable 4x4 puzzle, and
+    hard 25x25 puzzles take far too long to find
+    '''
+    if box < 3:
+        return DIFFICULTIES[:1]
+    if box > 4:
+        return DIFFICULTIES[:2]
+    return DIFFICULTIES
+
+
+def solvesByNakedSingles(grid):
+    '''
+    returns True when filling in fields with only one candidate
+    solves the grid, the solution is unique then
+    '''
+    L = layout(boxSize(grid))
+    cells = [d for row in grid for d in row]
+    cand = [L.all] * L.cells
+    queue = []
+    for i in range(L.cells):
+        if cells[i]:
+            cand[i] = L.bit[cells[i]]
+            queue.append(i)
+    peers = L.peers
+    while queue:
+        i = queue.pop()
+        bit = cand[i]
+        for p in peers[i]:
+            c = cand[p]
+            if c & bit:
+                c ^= bit
+                if not c:
+                    return False
+                cand[p] = c
+                if not c & (c - 1):
+                    queue.append(p)
+    return all(not c & (c - 1) for c in cand)
+
+
+def grade(grid, solver=None):
+    '''
+    returns the difficulty of a uniquely solvable puzzle
+    '''
+    solver = solver or solvers.NativeSolver()
+    if solvesByNakedSingles(grid):
+        return 'easy'
+    if solver.solvesBySingles(grid):
+        return 'medium'
+    return 'hard'
+
+
+class Generator(object):
+    '''
+    Makes a random solved grid and empties fields in random order as long
+    as the puzzle stays uniquely solvable by the means of its difficulty.
+    Easy and medium puzzles only need a singles check, which also proves
+    uniqueness; hard ones need a solution count, which stops at the second
+    solution. Fields are emptied in batches which shrink on failure, so
+    the many early removals that always work cost few checks.
+    '''
+    def __init__(self, seed=None, box=3):
+        self.box = box
+        self.rng = random.Random(seed)
+        self.solver = solvers.NativeSolver()
+        self.random_solver = solvers.NativeSolver(self.rng)
+        self.cancelled = False
+
+    def cancel(self):
+        '''
+        stops a running generate() from another thread for good,
+        it raises SolverCancelled then
+        '''
+        self.cancelled = True
+        self.solver.cancel()
+        self.random_solver.cancel()
+
+    def randomSolution(self):
+        '''
+        returns a random solved grid
+        '''
+        size = self.box * self.box
+        return self.random_solver.solve([[0] * size for r in range(size)])
+
+    def generate(self, difficulty='medium'):
+        '''
+        returns a puzzle of difficulty with a unique solution
+        '''
+        if difficulty not in DIFFICULTIES:
+            raise ValueError('unknown difficulty: %s' % difficulty)
+        if difficulty not in difficulties(self.box):
+            raise ValueError('there are no %s puzzles of block size %d'
+                             % (difficulty, self.box))
+
+        if difficulty == 'easy':
+            keeps = solvesByNakedSingles
+        elif difficulty == 'medium':
+            keeps = self.solver.solvesBySingles
+        else:
+            keeps = lambda grid: self.solver.count(grid, 2) == 1
+
+        while True:
+            if self.cancelled:
+                raise solvers.SolverCancelled()
+            grid = self.randomSolution()
+            cells = len(grid) ** 2
+            self.removeFields(grid, keeps, int(MIN_CLUES[difficulty] * cells))
+            if grade(grid, self.solver) == difficulty:
+                return grid
+
+    def removeFields(self, grid, keeps, min_clues):
+        '''
+        empties fields of grid in random order as long as keeps(grid)
+        stays True and more than min_clues fields are left
+        '''
+        size = len(grid)
+        cells = list(range(size * size))
+        self.rng.shuffle(cells)
+        clues = len(cells)
+        step = 8
+        i = 0
+        while i < len(cells) and clues > min_clues:
+            if self.cancelled:
+                raise solvers.SolverCancelled()
+            batch = cells[i:i + min(step, clues - min_clues)]
+            digits = []
+            for j in batch:
+                digits.append(grid[j // size][j % size])
+                grid[j // size][j % size] = 0
+            if keeps(grid):
+                clues -= len(batch)
+                i += len(batch)
+                continue
+            for j, digit in zip(batch, digits):
+                grid[j // size][j % size] = digit
+            if step == 1:
+                i += 1 # this field has to stay
+            else:
+                step //= 2
+
+    def variant(self, grid):
+        '''
+        returns a random puzzle equivalent to grid: digits relabeled, rows
+        permuted within their band, bands, columns within their stack,
+        stacks, and maybe transposed; it has the same number of solutions
+        and the same difficulty
+        '''
+        box = boxSize(grid)
+        rng = self.rng
+        def order():
+            groups = list(range(box))
+            rng.shuffle(groups)
+            lines = []
+            for g in groups:
+                inner = list(range(g * box, g * box + box))
+                rng.shuffle(inner)
+                lines.extend(inner)
+            return lines
+        labels = list(range(1, box * box + 1))
+        rng.shuffle(labels)
+        labels.insert(0, 0)
+        rows, cols = order(), order()
+        if rng.random() < 0.5:
+            grid = [list(column) for column in zip(*grid)]
+        return [[labels[grid[r][c]] for c in cols] for r in rows]
+
+
+class PuzzlePool(object):
+    '''
+    Generates puzzles of one difficulty in a background thread and keeps
+    up to size of them ready for wait(), which never generates in the
+    calling thread. stop() ends the background thread, also while it
+    waits for room in a full pool, e.g. when the pool is not needed any
+    more.
+    '''
+    def __init__(self, difficulty='medium', size=5, seed=None, box=3):
+        self.difficulty = difficulty
+        self.filler = Generator(seed, box)
+        self.ready = queue.Queue(size)
+        self.thread = threading.Thread(target=self._fill)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _fill(self):
+        try:
+            while True:
+                puzzle = self.filler.generate(self.difficulty)
+                while True:
+                    if self.filler.cancelled:
+                        return
+                    try:
+                        self.ready.put(puzzle, True, 0.1)
+                        break
+                    except queue.Full:
+                        pass
+        except solvers.SolverCancelled:
+            pass
+
+    def wait(self, timeout=None):
+        '''
+        returns a puzzle as soon as the background thread has one ready,
+        None if there is none after timeout seconds
+        '''
+        try:
+            return self.ready.get(True, timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        self.filler.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generates Sudoku puzzles '
+        'with a unique solution, one per line.')
+    parser.add_argument('-d', '--difficulty', default='medium',
+        choices=DIFFICULTIES)
+    parser.add_argument('-n', '--number', type=int, default=1,
+        help='number of puzzles')
+    parser.add_argument('-b', '--box', type=int, default=3,
+        help='block size, 3 for 9x9, 4 for 16x16, 5 for 25x25')
+    parser.add_argument('-v', '--variants', type=int, default=1,
+        help='puzzles made from every generated one by relabeling digits '
+             'and permuting rows and columns (same difficulty, much faster)')
+    parser.add_argument('--seed', type=int, help='seed for reproducible puzzles')
+    parser.add_argument('-q', '--quiet', action='store_true',
+        help='no summary on stderr')
+    args = parser.parse_args(argv)
+
+    if args.box < 2:
+        parser.error('the block size must be at least 2')
+    if args.difficulty not in difficulties(args.box):
+        parser.error('there are no %s puzzles of block size %d'
+                     % (args.difficulty, args.box))
+    if args.variants < 1:
+        parser.error('at least one variant is needed')
+    generator = Generator(args.seed, args.box)
+    start = time.time()
+    for n in range(args.number):
+        if n % args.variants == 0:
+            grid = puzzle = generator.generate(args.difficulty)
+        else:
+            grid = generator.variant(puzzle)
+        sys.stdout.write(puzzles.formatGrid(grid) + '\n')
+    seconds = time.time() - start
+    if not args.quiet:
+        sys.stderr.write('%d puzzles in %.2fs, %.1f/s\n' % (args.number,
+                         seconds, args.number / seconds if seconds else 0))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
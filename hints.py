@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+'''
+Hints for the Sudoku field, served from one cached solution.
+'''
+
+
+class HintSession(object):
+    '''
+    Solves the board once and serves all further hints from the cached
+    solution. The solution stays valid until the user enters a digit
+    which conflicts with it. Every field filled by a hint or by the
+    whole solution is pushed on a stack, so undoing a hint is O(1).
+    '''
+    def __init__(self, board, solver):
+        self.board = board
+        self.solver = solver
+        self.cached = None  # flat bytearray of the cached solution
+        self.key = None     # board the cached result was computed for
+        self.stack = []     # indices of calculated fields, latest last
+
+    def setSolver(self, solver):
+        self.solver = solver
+        self.invalidate()
+
+    def invalidate(self):
+        self.cached = None
+        self.key = None
+
+    def reset(self):
+        '''
+        forgets the solution and the hint stack, e.g. for a new game
+        '''
+        self.invalidate()
+        self.stack = []
+
+    def edited(self, index, digit):
+        '''
+        gets called when the user changed a field, drops the cached
+        solution if it does not fit the new digit
+        '''
+        if self.cached is None:
+            self.key = None # the board was unsolvable, it may not be now
+        elif digit and self.cached[index] != digit:
+            self.invalidate()
+
+    def isKnown(self):
+        '''
+        returns True when solution() can answer without the solver
+        '''
+        return self.cached is not None or self.key == bytes(self.board.cells)
+
+    def store(self, solution):
+        '''
+        stores the solution of the current board (None if it has none),
+        e.g. when it was solved in the background
+        '''
+        self.key = bytes(self.board.cells)
+        if solution is None:
+            self.cached = None
+        else:
+            self.cached = bytearray(d for row in solution for d in row)
+
+    def solution(self):
+        '''
+        returns the solution of the board as a list of rows or None
+        if it has no solution, the solver only runs when needed
+        '''
+        if not self.isKnown():
+            self.store(self.solver.solve(self.board.grid()))
+        if self.cached is None:
+            return None
+        size = self.board.size
+        return [list(self.cached[r*size:r*size + size]) for r in range(size)]
+
+    def fill(self):
+        '''
+        fills all empty fields with the solution,
+        returns the filled indices or None if there is no solution
+        '''
+        solution = self.solution()
+        if solution is None:
+            return None
+        changed = self.board.fill(solution)
+        self.stack.extend(changed)
+        return changed
+
+    def nextHint(self):
+        '''
+        fills the first empty field with its digit of the solution,
+        returns its index, -1 when the board is full
+        or None if there is no solution
+        '''
+        i = self.board.firstEmpty()
+        if i < 0:
+            return -1
+        if self.solution() is None:
+            return None
+        self.board.set(i // self.board.size, i % self.board.size,
+                       self.cached[i], True)
+        self.stack.append(i)
+        return i
+
+    def prevHint(self):
+        '''
+        clears the latest calculated field,
+        returns its index or -1 if there is none
+        '''
+        while self.stack:
+            i = self.stack.pop()
+            if self.board.calculated[i]: # the user may have changed it
+                self.board.set(i // self.board.size, i % self.board.size, 0)
+                return i
+        return -1
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+'''
+Load test of a running solver service (see server.py), needs Python 3.7
+or newer. Keeps a number of connections busy with requests for the
+puzzles of a file and reports throughput, latencies and status codes.
+
+    python server.py -j 4 &
+    python loadtest.py hard.txt -c 64 -n 10000
+    python loadtest.py hard.txt --unix /tmp/sudoku.sock -e hint
+'''
+
+import sys, json, time, asyncio, argparse
+import puzzles
+
+
+def readLines(path):
+    '''
+    returns the puzzle lines of a file
+    '''
+    lines = []
+    file = puzzles.openPuzzles(path)
+    for number, grid in puzzles.readPuzzles(file):
+        if isinstance(grid, ValueError):
+            raise ValueError('line %d: %s' % (number, grid))
+        lines.append(puzzles.formatGrid(grid))
+    if file is not sys.stdin:
+        file.close()
+    return lines
+
+
+async def request(reader, writer, endpoint, body):
+    '''
+    sends one request on a keep-alive connection,
+    returns (status, JSON reply)
+    '''
+    data = json.dumps(body).encode('utf-8')
+    writer.write(('POST /%s HTTP/1.1\r\nHost: localhost\r\n'
+                  'Content-Type: application/json\r\nContent-Length: %d\r\n'
+                  '\r\n' % (endpoint, len(data))).encode('ascii') + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads((await reader.readexactly(length)).decode())
+
+
+class LoadTest(object):
+    '''
+    Sends number requests over connections connections, every
+    connection sends its next request when the reply came.
+    '''
+    def __init__(self, lines, endpoint, number, connections, host, port,
+                 unix=None):
+        self.lines = lines
+        self.endpoint = endpoint
+        self.number = number
+        self.connections = connections
+        self.address = (host, port)
+        self.unix = unix
+        self.sent = 0
+        self.latencies = []
+        self.statuses = {}
+
+    async def connect(self):
+        if self.unix:
+            return await asyncio.open_unix_connection(self.unix)
+        return await asyncio.open_connection(*self.address)
+
+    async def client(self):
+        reader, writer = await self.connect()
+        try:
+            while self.sent < self.number:
+                line = self.lines[self.sent % len(self.lines)]
+                self.sent += 1
+                start = time.perf_counter()
+                status, reply = await request(reader, writer, self.endpoint,
+                                              {'puzzle': line})
+                self.latencies.append(time.perf_counter() - start)
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+
+    async def run(self):
+        '''
+        returns the seconds all requests took
+        '''
+        start = time.perf_counter()
+        await asyncio.gather(*[self.client()
+                               for i in range(self.connections)])
+        return time.perf_counter() - start
+
+    def percentile(self, p):
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(p / 100.0 * len(ordered)))]
+
+    def report(self, seconds):
+        '''
+        returns a summary as text
+        '''
+        return '%d requests in %.2fs, %.1f/s, latency p50 %.1f ms, ' \
+            'p99 %.1f ms, max %.1f ms, status %s' % (len(self.latencies),
+            seconds, len(self.latencies) / seconds if seconds else 0,
+            self.percentile(50) * 1000, self.percentile(99) * 1000,
+            max(self.latencies or [0]) * 1000,
+            ', '.join('%d: %d' % item for item in sorted(self.statuses.items())))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test of a running '
+        'solver service.')
+    parser.add_argument('file', help='puzzles, one per line, - for stdin')
+    parser.add_argument('-e', '--endpoint', default='solve',
+        choices=('solve', 'hint', 'validate', 'count'))
+    parser.add_argument('-n', '--number', type=int, default=1000,
+        help='number of requests, the puzzles are repeated as needed')
+    parser.add_argument('-c', '--connections', type=int, default=16,
+        help='number of concurrent connections')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8765)
+    parser.add_argument('--unix', help='connect to this Unix socket instead')
+    args = parser.parse_args(argv)
+
+    try:
+        lines = readLines(args.file)
+    except (IOError, ValueError) as error:
+        sys.stderr.write('%s: %s\n' % (args.file, error))
+        return 1
+    if not lines:
+        parser.error('no puzzles in %s' % args.file)
+    test = LoadTest(lines, args.endpoint, args.number, args.connections,
+                    args.host, args.port, args.unix)
+    try:
+        seconds = asyncio.run(test.run())
+    except (OSError, ValueError, asyncio.IncompleteReadError) as error:
+        sys.stderr.write('%s\n' % (error or 'connection closed'))
+        return 1
+    sys.stdout.write(test.report(seconds) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+'''
+Reading and writing puzzles in the common text format:
+one puzzle per line, 81 characters row by row,
+digits for given fields and '0' or '.' for empty ones.
+
+Other sizes work the same way, with 16 (4x4), 256 (16x16) or 625 (25x25)
+characters per line; digits above 9 are written as letters, A for 10
+up to G for 16 and P for 25.
+'''
+
+import sys, gzip
+
+EMPTY = '0.'
+DIGITS = '123456789ABCDEFGHIJKLMNOP'
+
+
+def parsePuzzle(line):
+    '''
+    returns the grid of a puzzle line, None for blank and comment lines,
+    raises ValueError when the line is no puzzle
+    '''
+    line = line.strip()
+    if not line or line[0] == '#':
+        return None
+    text = line.split()[0] # some files append a rating or a comment
+    size = int(round(len(text) ** 0.25)) ** 2
+    if size < 4 or size * size != len(text):
+        raise ValueError('a puzzle needs 16, 81, 256 or 625 fields, not %d'
+                         % len(text))
+    cells = []
+    for ch in text.upper():
+        if ch in EMPTY:
+            cells.append(0)
+        elif ch in DIGITS[:size]:
+            cells.append(DIGITS.index(ch) + 1)
+        else:
+            raise ValueError('invalid character %r' % ch)
+    return [cells[r*size:r*size + size] for r in range(size)]
+
+
+def formatGrid(grid, empty='.'):
+    '''
+    returns the grid as one line, e.g. of 81 characters
+    '''
+    return ''.join(DIGITS[d - 1] if d else empty for row in grid for d in row)
+
+
+def openPuzzles(name):
+    '''
+    opens a puzzle file for reading, '-' is stdin and
+    files ending with .gz are decompressed on the fly
+    '''
+    if name == '-':
+        return sys.stdin
+    if name.endswith('.gz'):
+        return gzip.open(name, 'rt')
+    return open(name)
+
+
+def readPuzzles(file):
+    '''
+    yields (line number, grid or ValueError) for every puzzle in file,
+    the file is read line by line and never loaded as a whole
+    '''
+    for number, line in enumerate(file, 1):
+        try:
+            grid = parsePuzzle(line)
+        except ValueError as error:
+            yield number, error
+            continue
+        if grid is not None:
+            yield number, grid
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+'''
+A local HTTP/JSON service for the solvers, needs Python 3.7 or newer.
+
+    python server.py --port 8765 -j 4
+    python server.py --unix /tmp/sudoku.sock
+
+Every endpoint takes a POST with a JSON object whose "puzzle" is a puzzle
+line (81 characters, see puzzles.py) or a list of rows:
+
+    /solve     {"solution": "...", or null if there is none}
+    /hint      {"index": i, "row": r, "col": c, "digit": d}, index -1 for
+               a full board, {"index": null} if there is no solution
+    /validate  {"valid": ..., "complete": ..., "conflicts": [indices]}
+    /count     {"count": n}, counting stops at "limit" (default 2,
+               at most 100)
+
+GET /health answers {"status": "ok", ...}. Puzzles go through a Board and
+a HintSession like in the game, so both give the same answers. They are
+solved by a pool of worker processes, which keep their solver warm.
+Requests that arrive while the workers are busy are sent to them in
+batches. When more than --backlog requests wait, new ones get
+503 at once. The solver stops a search that runs past the deadline of
+its request by itself, so slow requests cannot block the pool.
+'''
+
+import sys, json, time, asyncio, argparse, multiprocessing
+import concurrent.futures
+import solvers, puzzles
+from board import Board
+from hints import HintSession
+from cli import makeSolver
+
+MAX_BODY = 1 << 16
+MAX_LIMIT = 100 # most solutions /count counts
+
+STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+          405: 'Method Not Allowed', 413: 'Payload Too Large',
+          503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+# the solvers of a worker process, the backends get the time left
+# until the deadline of every job as their timeout
+_solver = None
+_counter = None
+_backends = ()
+
+
+def _initWorker(name, cached):
+    global _solver, _counter, _backends
+    _solver = makeSolver(name, cached)
+    _counter = countingSolver(_solver)
+    backend = _solver
+    while hasattr(backend, 'solver'):
+        backend = backend.solver # unwrap cached or instrumented solvers
+    _backends = (backend, _counter)
+
+
+def _work(jobs):
+    '''
+    runs a batch of (endpoint, grid, limit, deadline) jobs in a worker
+    process, returns (status, answer or error message) for every job;
+    the search of a job stops at its deadline (time.monotonic())
+    '''
+    results = []
+    for endpoint, grid, limit, deadline in jobs:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            results.append((504, 'timed out'))
+            continue
+        for solver in _backends:
+            solver.timeout = left
+        try:
+            results.append((200, answer(_solver, endpoint, grid, limit,
+                                        _counter)))
+        except solvers.SolverTimeout:
+            results.append((504, 'timed out'))
+        except Exception as error:
+            results.append((400, str(error)))
+    return results
+
+
+def answer(solver, endpoint, grid, limit=2, counter=None):
+    '''
+    answers one request with solver, the same way the game does,
+    solutions are counted with counter (see countingSolver())
+    '''
+    board = Board(grid)
+    if endpoint == 'validate':
+        return validate(board)
+    if endpoint == 'count':
+        if board.hasConflicts():
+            return {'count': 0}
+        counter = counter or countingSolver(solver)
+        return {'count': counter.count(board.grid(), limit)}
+
+    hints = HintSession(board, solver)
+    if endpoint == 'solve':
+        solution = None if board.hasConflicts() else hints.solution()
+        return {'solution': puzzles.formatGrid(solution) if solution else None}
+
+    # hint
+    if board.hasConflicts():
+        return {'index': None}
+    i = hints.nextHint()
+    if i is None or i < 0:
+        return {'index': i}
+    size = board.size
+    return {'index': i, 'row': i // size, 'col': i % size,
+            'digit': board.cells[i]}
+
+
+def validate(board):
+    size = board.size
+    conflicts = [i for i in range(size * size)
+                 if board.conflicts(i // size, i % size)]
+    return {'valid': not conflicts, 'complete': board.isFull(),
+            'conflicts': conflicts}
+
+
+def countingSolver(solver):
+    '''
+    returns the backend of solver if it can count solutions,
+    a native solver otherwise
+    '''
+    while not hasattr(solver, 'count') and hasattr(solver, 'solver'):
+        solver = solver.solver # unwrap cached or instrumented solvers
+    if not hasattr(solver, 'count'):
+        solver = solvers.NativeSolver()
+    return solver
+
+
+def parseGrid(value):
+    '''
+    returns the grid of a "puzzle" value, raises ValueError
+    '''
+    if isinstance(value, str):
+        grid = puzzles.parsePuzzle(value)
+        if grid is None:
+            raise ValueError('empty puzzle')
+        return grid
+    if not isinstance(value, list) or \
+            not all(isinstance(row, list) for row in value):
+        raise ValueError('a puzzle is a string or a list of rows')
+    solvers.boxSize(value)
+    if not all(isinstance(d, int) and 0 <= d <= len(value)
+               for row in value for d in row):
+        raise ValueError('fields have to be digits from 0 to %d' % len(value))
+    return value
+
+
+class Overloaded(Exception):
+    '''
+    raised by Batcher.submit() when too many requests wait
+    '''
+
+
+class Batcher(object):
+    '''
+    Queues the jobs of requests and sends them to the worker pool,
+    all jobs waiting at that time (up to batch) in one call. Up to
+    2 * jobs calls are running, the queue holds up to backlog jobs.
+    Every job gets a deadline timeout seconds after it was submitted,
+    the solvers stop there, so a call ends soon after the latest
+    deadline of its jobs and gives its slot back.
+    '''
+    def __init__(self, executor, jobs, batch=64, backlog=1024, timeout=30.0):
+        self.executor = executor
+        self.batch = batch
+        self.timeout = timeout
+        self.queue = asyncio.Queue(backlog)
+        self.slots = asyncio.Semaphore(2 * jobs)
+        self.batches = self.batched = 0
+
+    def pending(self):
+        return self.queue.qsize()
+
+    async def submit(self, endpoint, grid, limit=2):
+        '''
+        returns the answer of the job, raises Overloaded,
+        asyncio.TimeoutError or RuntimeError with the worker's error
+        '''
+        if self.queue.full():
+            raise Overloaded()
+        future = asyncio.get_running_loop().create_future()
+        deadline = time.monotonic() + self.timeout
+        self.queue.put_nowait(((endpoint, grid, limit, deadline), future))
+        # the worker keeps the deadline, waiting a little longer gets
+        # its own answer unless the worker hangs
+        status, result = await asyncio.wait_for(future, self.timeout + 1.0)
+        if status == 504:
+            raise asyncio.TimeoutError()
+        if status != 200:
+            raise RuntimeError(result)
+        return result
+
+    async def run(self):
+        while True:
+            await self.slots.acquire()
+            items = [await self.queue.get()]
+            while len(items) < self.batch and not self.queue.empty():
+                items.append(self.queue.get_nowait())
+            asyncio.ensure_future(self._dispatch(items))
+
+    async def _dispatch(self, items):
+        try:
+            # requests that timed out meanwhile are not solved any more
+            items = [item for item in items if not item[1].done()]
+            if not items:
+                return
+            self.batches += 1
+            self.batched += len(items)
+            loop = asyncio.get_running_loop()
+            try:
+                results = await loop.run_in_executor(self.executor, _work,
+                    [job for job, future in items])
+            except Exception as error: # e.g. a worker died
+                results = [(400, str(error))] * len(items)
+            for (job, future), result in zip(items, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self.slots.release()
+
+
+class Server(object):
+    '''
+    A minimal HTTP/1.1 server with keep-alive on top of asyncio streams.
+    '''
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await self.readRequest(reader)
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                status, reply = await self.route(method, path, body)
+                data = json.dumps(reply).encode('utf-8')
+                writer.write(('HTTP/1.1 %d %s\r\n'
+                              'Content-Type: application/json\r\n'
+                              'Content-Length: %d\r\n'
+                              '%s\r\n' % (status, STATUS[status], len(data),
+                              '' if keep_alive else 'Connection: close\r\n')
+                             ).encode('ascii') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def readRequest(self, reader):
+        '''
+        returns (method, path, body, keep alive) or None at the end
+        of the connection, body is None if it is too large,
+        raises ValueError for broken requests
+        '''
+        line = await reader.readline()
+        if not line:
+            return None
+        parts = line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise ValueError('bad request line')
+        method, path, version = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length > MAX_BODY:
+            return method, path, None, False # answered with 413
+        body = await reader.readexactly(length) if length else b''
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' \
+            else connection == 'keep-alive'
+        return method, path, body, keep_alive
+
+    async def route(self, method, path, body):
+        '''
+        returns (status, JSON object) of a request
+        '''
+        endpoint = path.split('?')[0].strip('/')
+        if endpoint == 'health':
+            return 200, {'status': 'ok', 'pending': self.batcher.pending(),
+                         'batches': self.batcher.batches,
+                         'batched': self.batcher.batched}
+        if endpoint not in ('solve', 'hint', 'validate', 'count'):
+            return 404, {'error': 'unknown endpoint %s' % path}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+        if body is None:
+            return 413, {'error': 'more than %d bytes' % MAX_BODY}
+        try:
+            request = json.loads(body.decode('utf-8'))
+            grid = parseGrid(request['puzzle'])
+            limit = int(request.get('limit', 2))
+            if not 1 <= limit <= MAX_LIMIT:
+                raise ValueError('limit has to be from 1 to %d' % MAX_LIMIT)
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            return 400, {'error': 'bad request: %s' % error}
+        try:
+            return 200, await self.batcher.submit(endpoint, grid, limit)
+        except Overloaded:
+            return 503, {'error': 'too many requests, try again later'}
+        except asyncio.TimeoutError:
+            return 504, {'error': 'the solver took too long'}
+        except RuntimeError as error:
+            return 400, {'error': str(error)}
+
+
+async def serve(args):
+    jobs = args.jobs if args.jobs > 0 else multiprocessing.cpu_count()
+    executor = concurrent.futures.ProcessPoolExecutor(jobs,
+        initializer=_initWorker, initargs=(args.solver, args.cache))
+    # start the workers and their solvers before the first request
+    await asyncio.gather(*[asyncio.get_running_loop().run_in_executor(
+        executor, _work, []) for i in range(jobs)])
+
+    batcher = Batcher(executor, jobs, args.batch, args.backlog, args.timeout)
+    server = Server(batcher)
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle, args.unix)
+        where = args.unix
+    else:
+        listener = await asyncio.start_server(server.handle, args.host,
+                                              args.port)
+        where = 'http://%s:%d' % (args.host, args.port)
+    if not args.quiet:
+        sys.stderr.write('serving on %s with %d %s workers\n'
+                         % (where, jobs, args.solver))
+    batching = asyncio.ensure_future(batcher.run())
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        batching.cancel()
+        executor.shutdown(wait=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serves the solvers over '
+        'HTTP/JSON.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8765)
+    parser.add_argument('--unix', help='listen on this Unix socket instead')
+    parser.add_argument('-s', '--solver', default='native',
+        choices=sorted(solvers.SOLVERS), help='solver backend')
+    parser.add_argument('--cache', action='store_true',
+        help='cache solutions in every worker')
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+        help='number of worker processes, 0 for one per core')
+    parser.add_argument('--batch', type=int, default=64,
+        help='most requests sent to a worker at once')
+    parser.add_argument('--backlog', type=int, default=1024,
+        help='most waiting requests, further ones get 503')
+    parser.add_argument('--timeout', type=float, default=30.0,
+        help='seconds until a request gets 504')
+    parser.add_argument('-q', '--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    if not solvers.SOLVERS[args.solver].available():
+        parser.error('solver %s is not available here' % args.solver)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
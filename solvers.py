@@ -0,0 +1,1126 @@
+# -*- coding: utf-8 -*-
+'''
+Solver backends for Sudoku.
+
+A grid is a list of n*n rows with n*n ints each, 0 stands for an empty
+field; n is the block size, 3 for the usual 9x9 Sudoku, 4 for 16x16 and
+5 for 25x25. Every backend takes such a grid and returns the solved grid
+or None.
+'''
+
+import os, re, random, select, subprocess, threading, time, weakref, atexit
+
+try:
+    timer = time.perf_counter
+except AttributeError: # python 2
+    timer = time.time
+
+try:
+    import queue
+except ImportError: # python 2
+    import Queue as queue
+
+PROGRAM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sudoku.pro')
+
+class Layout(object):
+    '''
+    The fields, units and peers of a board with block size box.
+    Fields are numbered row by row, candidates of a field are stored
+    as a bitmask, bit d stands for digit d.
+    '''
+    def __init__(self, box):
+        n = self.box = box
+        size = self.size = box * box
+        self.cells = size * size
+        self.all = (1 << (size + 1)) - 2
+        self.bit = [1 << d for d in range(size + 1)]
+        self.digit = dict((1 << d, d) for d in range(1, size + 1))
+        # a table is faster than counting, but too big for 25 digits
+        self.popcount = [bin(m).count('1') for m in range(1 << (size + 1))] \
+            if size <= 16 else None
+
+        self.rows = [[r*size + c for c in range(size)] for r in range(size)]
+        self.columns = [[r*size + c for r in range(size)] for c in range(size)]
+        self.blocks = [[(br*n + r)*size + bc*n + c for r in range(n)
+                        for c in range(n)] for br in range(n) for bc in range(n)]
+        self.units = self.rows + self.columns + self.blocks
+        # unit numbers of every field: row, size + column, 2*size + block
+        self.units_of = [(r, size + c, 2*size + (r // n)*n + c // n)
+                         for r in range(size) for c in range(size)]
+        self.peers = [sorted(set(p for u in self.units_of[i]
+                                 for p in self.units[u]) - set([i]))
+                      for i in range(self.cells)]
+        # every block with each row and column crossing it: the common
+        # fields are a segment, for segment k intersections[k] holds
+        # (other segments of the block, other segments of the line,
+        # rest of the block, rest of the line)
+        self.segments = []
+        lines = []
+        for block in self.blocks:
+            for line in [self.rows[block[0] // size + r] for r in range(n)] + \
+                    [self.columns[block[0] % size + c] for c in range(n)]:
+                self.segments.append([i for i in block if i in line])
+                lines.append(line)
+        self.intersections = []
+        for k, segment in enumerate(self.segments):
+            first = k - k % n # the n rows or the n columns of the block
+            self.intersections.append((
+                [j for j in range(first, first + n) if j != k],
+                [j for j in range(len(lines)) if j != k and lines[j] is lines[k]],
+                [i for i in self.blocks[k // (2*n)] if i not in segment],
+                [i for i in lines[k] if i not in segment]))
+
+
+_layouts = {}
+
+def layout(box=3):
+    '''
+    returns the Layout of block size box, they are built once
+    '''
+    if box not in _layouts:
+        _layouts[box] = Layout(box)
+    return _layouts[box]
+
+
+def boxSize(grid):
+    '''
+    returns the block size of a grid, raises ValueError for
+    grids which are no Sudoku
+    '''
+    box = int(round(len(grid) ** 0.5))
+    if box < 2 or box * box != len(grid) or \
+            any(len(row) != len(grid) for row in grid):
+        raise ValueError('a grid needs n*n rows of n*n fields')
+    return box
+
+
+def matchDigits(options):
+    '''
+    gives every candidate mask in options a digit of its own, returns
+    a dict digit bit -> index in options or None when that is impossible
+    '''
+    mate = {}
+    def augment(f, seen):
+        digits = options[f]
+        while digits:
+            bit = digits & -digits
+            digits ^= bit
+            if seen[0] & bit:
+                continue
+            seen[0] |= bit
+            if bit not in mate or augment(mate[bit], seen):
+                mate[bit] = f
+                return True
+        return False
+    for f in range(len(options)):
+        if not augment(f, [0]):
+            return None
+    return mate
+
+
+def strongComponents(successors):
+    '''
+    returns the number of the strongly connected component of every
+    node of a graph given as lists of successors (Tarjan, without
+    recursion)
+    '''
+    count = len(successors)
+    index = [0] * count
+    low = [0] * count
+    component = [-1] * count
+    stack = []
+    found = 0
+    visited = 0
+    for root in range(count):
+        if index[root]:
+            continue
+        visited += 1
+        index[root] = low[root] = visited
+        stack.append(root)
+        path = [(root, 0)]
+        while path:
+            v, k = path[-1]
+            if k < len(successors[v]):
+                path[-1] = (v, k + 1)
+                w = successors[v][k]
+                if not index[w]:
+                    visited += 1
+                    index[w] = low[w] = visited
+                    stack.append(w)
+                    path.append((w, 0))
+                elif component[w] < 0 and index[w] < low[v]:
+                    low[v] = index[w]
+                continue
+            path.pop()
+            if path and low[v] < low[path[-1][0]]:
+                low[path[-1][0]] = low[v]
+            if low[v] == index[v]:
+                while True:
+                    w = stack.pop()
+                    component[w] = found
+                    if w == v:
+                        break
+                found += 1
+    return component
+
+
+# the usual 9x9 board
+LAYOUT = layout(3)
+ALL = LAYOUT.all
+BIT = LAYOUT.bit
+DIGIT = LAYOUT.digit
+POPCOUNT = LAYOUT.popcount
+
+# the 27 units (rows, columns, blocks) and the 20 peers of every field
+ROWS = LAYOUT.rows
+COLUMNS = LAYOUT.columns
+BLOCKS = LAYOUT.blocks
+UNITS = LAYOUT.units
+PEERS = LAYOUT.peers
+
+
+class SolverTimeout(Exception):
+    '''
+    raised when a solver backend did not answer in time
+    '''
+
+
+class SolverCancelled(Exception):
+    '''
+    raised by solve() when cancel() was called while solving
+    '''
+
+
+class SearchRestart(Exception):
+    '''
+    raised by a search when its attempt used up its backtracks,
+    solve() then starts over
+    '''
+
+
+class Solver(object):
+    '''
+    Base class of all solver backends.
+    '''
+    name = None
+    cancelled = False
+    timeout = None # seconds a solve() may take, then SolverTimeout
+
+    # what the latest search cost, backends leave out what they do not
+    # count and list the ones they keep in counted; techniques maps a
+    # propagation technique to how often it fired
+    COUNTERS = ('nodes', 'backtracks', 'rounds', 'io_seconds', 'techniques')
+    counted = ()
+    nodes = 0
+    backtracks = 0
+    rounds = 0
+    io_seconds = 0.0
+    techniques = None
+
+    def solve(self, grid):
+        '''
+        returns the solved grid or None if there is no solution
+        '''
+        raise NotImplementedError
+
+    @classmethod
+    def available(cls):
+        '''
+        returns True when the backend can be used on this machine
+        '''
+        return True
+
+    def cancel(self):
+        '''
+        stops a running solve() from another thread,
+        which then raises SolverCancelled
+        '''
+        self.cancelled = True
+
+
+class NativeSolver(Solver):
+    '''
+    In-process solver, uses bitmask candidates, constraint propagation
+    (naked and hidden singles, on 16x16 and larger boards also locked
+    candidates and naked and hidden subsets) and backtracking on the
+    field with the fewest candidates (MRV). With a random.Random as rng
+    the candidates are tried in random order, e.g. to generate random
+    grids. On 16x16 and larger boards solve() starts over in another
+    random order when an attempt backtracks more than restart_backtracks
+    times, every attempt gets restart_growth times the backtracks of the
+    one before.
+    '''
+    name = 'native'
+    counted = ('nodes', 'backtracks', 'rounds', 'techniques')
+    restart_backtracks = 50
+    restart_growth = 1.2
+    budget = None
+
+    def __init__(self, rng=None):
+        self.rng = rng
+        self.layout = LAYOUT
+
+    def solve(self, grid):
+        cand, queue = self._start(grid)
+        if self.layout.box <= 3:
+            for result in self._search(cand, queue):
+                return self._grid(result)
+            return None
+
+        rng = self.rng
+        backtracks = self.restart_backtracks
+        attempt = 0
+        try:
+            while True:
+                self.budget = self.backtracks + backtracks
+                try:
+                    for result in self._search(cand[:], queue[:]):
+                        return self._grid(result)
+                    return None
+                except SearchRestart:
+                    attempt += 1
+                    if rng is None:
+                        self.rng = random.Random(attempt)
+                    backtracks = int(backtracks * self.restart_growth)
+        finally:
+            self.rng = rng
+            self.budget = None
+
+    def count(self, grid, limit=2):
+        '''
+        returns the number of solutions, but stops counting at limit
+        '''
+        found = 0
+        for cand in self._solutions(grid):
+            found += 1
+            if found >= limit:
+                break
+        return found
+
+    def solvesBySingles(self, grid):
+        '''
+        returns True when naked and hidden singles solve the grid
+        without any guessing, the solution is unique then
+        '''
+        cand, queue = self._start(grid)
+        return self._propagate(cand, queue, False) and \
+            all(not c & (c - 1) for c in cand)
+
+    def _grid(self, cand):
+        size = self.layout.size
+        digit = self.layout.digit
+        return [[digit[cand[r*size + c]] for c in range(size)]
+                for r in range(size)]
+
+    def _start(self, grid):
+        self.cancelled = False
+        self.deadline = timer() + self.timeout if self.timeout else None
+        self.nodes = self.backtracks = self.rounds = 0
+        self.techniques = {'naked singles': 0, 'hidden singles': 0,
+                           'locked candidates': 0,
+                           'naked and hidden subsets': 0}
+        self.consistent = {}
+        self.layout = L = layout(boxSize(grid))
+        cand = [L.all] * L.cells
+        queue = []
+
+        for i in range(L.cells):
+            d = grid[i // L.size][i % L.size]
+            if d:
+                if not 0 < d <= L.size:
+                    raise ValueError('invalid digit %r' % d)
+                cand[i] = L.bit[d]
+                queue.append(i)
+        return cand, queue
+
+    def _solutions(self, grid):
+        cand, queue = self._start(grid)
+        return self._search(cand, queue)
+
+    def _propagate(self, cand, queue, locked=None):
+        '''
+        removes the digits of all solved fields in queue from their peers
+        and fills in hidden singles, returns False on a contradiction;
+        when that gets stuck and locked is set (default: on boards larger
+        than 9x9) locked candidates and subsets are removed as well
+        '''
+        if locked is None:
+            locked = self.layout.box > 3
+        peers = self.layout.peers
+        units = self.layout.units
+        full = self.layout.all
+        techniques = self.techniques
+        while True:
+            self.rounds += 1
+            while queue:
+                i = queue.pop()
+                bit = cand[i]
+                for p in peers[i]:
+                    c = cand[p]
+                    if c & bit:
+                        c ^= bit
+                        if not c:
+                            return False
+                        cand[p] = c
+                        if not c & (c - 1): # naked single
+                            queue.append(p)
+                            techniques['naked singles'] += 1
+
+            for unit in units:
+                once = twice = solved = 0
+                for i in unit:
+                    c = cand[i]
+                    twice |= once & c
+                    once |= c
+                    if not c & (c - 1):
+                        if solved & c: # the same digit twice in a unit
+                            return False
+                        solved |= c
+                if once != full: # some digit has no place left
+                    return False
+                hidden = once & ~twice & ~solved
+                while hidden:
+                    bit = hidden & -hidden
+                    hidden ^= bit
+                    for i in unit:
+                        if cand[i] & bit:
+                            cand[i] = bit
+                            queue.append(i)
+                            techniques['hidden singles'] += 1
+                            break
+            if not queue:
+                if not locked:
+                    return True
+                removed = self._lockedCandidates(cand, queue)
+                if removed is None:
+                    return False
+                if removed:
+                    techniques['locked candidates'] += removed
+                    continue
+                removed = self._subsets(cand, queue)
+                if removed is None:
+                    return False
+                if not removed:
+                    return True
+                techniques['naked and hidden subsets'] += removed
+
+    def _lockedCandidates(self, cand, queue):
+        '''
+        a digit of a block which only fits where the block crosses a line
+        can be removed from the rest of that line (pointing), and the other
+        way round (claiming); returns the number of removed candidates,
+        None on a contradiction
+        '''
+        removed = 0
+        inside = []
+        for segment in self.layout.segments:
+            digits = 0
+            for i in segment:
+                digits |= cand[i]
+            inside.append(digits)
+        for k, (blockwise, linewise, block, line) in \
+                enumerate(self.layout.intersections):
+            in_block = in_line = 0
+            for j in blockwise:
+                in_block |= inside[j]
+            for j in linewise:
+                in_line |= inside[j]
+            for rest, digits in ((line, inside[k] & ~in_block & in_line),
+                                 (block, inside[k] & ~in_line & in_block)):
+                if not digits:
+                    continue
+                for i in rest:
+                    c = cand[i]
+                    if c & digits:
+                        c &= ~digits
+                        if not c:
+                            return None
+                        cand[i] = c
+                        removed += 1
+                        if not c & (c - 1):
+                            queue.append(i)
+        return removed
+
+    def _subsets(self, cand, queue):
+        '''
+        naked and hidden subsets of any size: the open fields of a unit
+        get the digits it misses, one each, a candidate which is in no
+        such matching goes (the fields are strongly connected through
+        the matching then); returns the number of changed fields, None
+        on a contradiction. Units found without such candidates are
+        remembered in consistent, by their candidates.
+        '''
+        consistent = self.consistent
+        if len(consistent) > 100000:
+            consistent.clear()
+        full = self.layout.all
+        changed = 0
+        for unit in self.layout.units:
+            key = tuple([cand[i] for i in unit])
+            if key in consistent:
+                continue
+            fields = []
+            placed = 0
+            for i in unit:
+                c = cand[i]
+                if c & (c - 1):
+                    fields.append(i)
+                else:
+                    placed |= c
+            if bin(full & ~placed).count('1') != len(fields):
+                return None # a digit twice
+            options = [cand[i] & ~placed for i in fields]
+            # k fields with k digits between them need the k-th shortest
+            # candidate list to have k digits at most
+            counts = sorted(bin(c).count('1') for c in options)
+            if all(counts[k] > k + 1 for k in range(len(counts) - 1)):
+                consistent[key] = True
+                continue
+            mate = matchDigits(options)
+            if mate is None:
+                return None
+            own = [0] * len(fields)
+            for bit, f in mate.items():
+                own[f] = bit
+            successors = []
+            for f in range(len(fields)):
+                digits = options[f] & ~own[f]
+                successors.append([])
+                while digits:
+                    bit = digits & -digits
+                    digits ^= bit
+                    successors[f].append(mate[bit])
+            component = strongComponents(successors)
+
+            before = changed
+            for f, i in enumerate(fields):
+                keep = own[f]
+                digits = options[f] & ~keep
+                while digits:
+                    bit = digits & -digits
+                    digits ^= bit
+                    if component[mate[bit]] == component[f]:
+                        keep |= bit
+                if keep != cand[i]:
+                    cand[i] = keep
+                    changed += 1
+                    if not keep & (keep - 1):
+                        queue.append(i)
+            if changed == before:
+                consistent[key] = True
+        return changed
+
+    def _search(self, cand, queue):
+        '''
+        propagates and then tries every candidate of the field with
+        the fewest candidates, yields the solved candidate lists
+        '''
+        if self.cancelled:
+            raise SolverCancelled()
+        if self.deadline is not None and timer() > self.deadline:
+            raise SolverTimeout('no solution within %gs' % self.timeout)
+        if self.budget is not None and self.backtracks >= self.budget:
+            raise SearchRestart()
+        self.nodes += 1
+        if not self._propagate(cand, queue):
+            self.backtracks += 1
+            return
+
+        best = -1
+        count = self.layout.size + 1
+        popcount = self.layout.popcount
+        for i in range(self.layout.cells):
+            c = cand[i]
+            if c & (c - 1):
+                n = popcount[c] if popcount else bin(c).count('1')
+                if n < count:
+                    best, count = i, n
+                    if n == 2:
+                        break
+        if best < 0: # every field is solved
+            yield cand
+            return
+
+        c = cand[best]
+        bits = []
+        while c:
+            bit = c & -c
+            c ^= bit
+            bits.append(bit)
+        if self.rng is not None:
+            self.rng.shuffle(bits)
+        for bit in bits:
+            new = cand[:]
+            new[best] = bit
+            for result in self._search(new, [best]):
+                yield result
+
+
+class ExactCover(object):
+    '''
+    The exact cover matrix of a board with block size box, as dancing
+    links: one matrix row per field and digit, one column per constraint
+    (a field holds one digit, every row, column, block and, for the
+    diagonal variant, both diagonals hold every digit once). The nodes
+    are stored in flat lists of ints, node 0 is the root and nodes 1 to
+    columns the column headers. They are allocated once, every search
+    leaves the links as it found them.
+    '''
+    def __init__(self, box, diagonal=False):
+        L = layout(box)
+        size = self.size = L.size
+        cells = L.cells
+        columns = cells + len(L.units) * size + (2 * size if diagonal else 0)
+
+        # the root and the column headers, linked in a circle
+        self.left = [c - 1 for c in range(columns + 1)]
+        self.left[0] = columns
+        self.right = [c + 1 for c in range(columns + 1)]
+        self.right[columns] = 0
+        self.up = list(range(columns + 1))
+        self.down = list(range(columns + 1))
+        self.column = list(range(columns + 1))
+        self.count = [0] * (columns + 1) # nodes in a column
+        self.row = [-1] * (columns + 1)  # field*size + digit - 1 of a node
+        self.first = []                  # first node of every matrix row
+        self.busy = False
+
+        diagonal_column = cells + len(L.units) * size + 1
+        for i in range(cells):
+            r, c = divmod(i, size)
+            for d in range(size):
+                headers = [1 + i] + [1 + cells + u*size + d for u in L.units_of[i]]
+                if diagonal and r == c:
+                    headers.append(diagonal_column + d)
+                if diagonal and r + c == size - 1:
+                    headers.append(diagonal_column + size + d)
+                self._addRow(i*size + d, headers)
+
+    def _addRow(self, row, headers):
+        first = len(self.up)
+        for k, h in enumerate(headers):
+            n = first + k
+            self.left.append(n - 1 if k else first + len(headers) - 1)
+            self.right.append(n + 1 if k < len(headers) - 1 else first)
+            self.up.append(self.up[h])
+            self.down.append(h)
+            self.down[self.up[h]] = n
+            self.up[h] = n
+            self.column.append(h)
+            self.count[h] += 1
+            self.row.append(row)
+        self.first.append(first)
+
+
+class DLXSolver(Solver):
+    '''
+    Knuth's Algorithm X with dancing links. Finds the first solution,
+    counts solutions or yields all of them lazily. The matrix of a block
+    size is built on first use and reused for every further puzzle,
+    with diagonal set both diagonals need every digit once as well
+    (Sudoku X). On 16x16 and larger boards solve() restarts like
+    NativeSolver, later attempts pick among the columns with the fewest
+    rows and their rows in random order.
+    '''
+    name = 'dlx'
+    counted = ('nodes', 'backtracks')
+    restart_backtracks = 1000
+    restart_growth = 1.2
+    budget = None
+    rng = None
+
+    def __init__(self, diagonal=False):
+        self.diagonal = diagonal
+        self.matrices = {} # an ExactCover per block size
+
+    def solve(self, grid):
+        matrix, given = self._start(grid)
+        backtracks = self.restart_backtracks
+        attempt = 0
+        try:
+            while True:
+                if matrix.size > 9:
+                    self.budget = self.backtracks + backtracks
+                found = self._search(matrix, given)
+                try:
+                    for solution in found:
+                        return solution
+                    return None
+                except SearchRestart:
+                    attempt += 1
+                    self.rng = random.Random(attempt)
+                    backtracks = int(backtracks * self.restart_growth)
+                finally:
+                    found.close()
+        finally:
+            self.rng = None
+            self.budget = None
+
+    def count(self, grid, limit=None):
+        '''
+        returns the number of solutions, but stops counting at limit
+        '''
+        found = self.solutions(grid)
+        number = 0
+        try:
+            for solution in found:
+                number += 1
+                if number == limit:
+                    break
+        finally:
+            found.close()
+        return number
+
+    def solutions(self, grid):
+        '''
+        returns a generator of all solved grids, each one is only
+        searched for when it is asked for
+        '''
+        return self._search(*self._start(grid))
+
+    def _start(self, grid):
+        box = boxSize(grid)
+        size = box * box
+        given = []
+        for r, row in enumerate(grid):
+            for c, d in enumerate(row):
+                if d:
+                    if not 0 < d <= size:
+                        raise ValueError('invalid digit %r' % d)
+                    given.append((r*size + c)*size + d - 1)
+        if box not in self.matrices:
+            self.matrices[box] = ExactCover(box, self.diagonal)
+        self.cancelled = False
+        self.deadline = timer() + self.timeout if self.timeout else None
+        self.nodes = self.backtracks = 0
+        return self.matrices[box], given
+
+    def _search(self, matrix, given):
+        '''
+        selects the matrix rows of the given digits, then searches for
+        covers of the remaining columns and yields them as grids;
+        all links are restored when the generator ends or is closed
+        '''
+        if matrix.busy:
+            raise RuntimeError('the solver is already searching')
+        matrix.busy = True
+        L, R, U, D = matrix.left, matrix.right, matrix.up, matrix.down
+        C, S = matrix.column, matrix.count
+
+        def cover(c):
+            L[R[c]] = L[c]
+            R[L[c]] = R[c]
+            i = D[c]
+            while i != c:
+                j = R[i]
+                while j != i:
+                    U[D[j]] = U[j]
+                    D[U[j]] = D[j]
+                    S[C[j]] -= 1
+                    j = R[j]
+                i = D[i]
+
+        def uncover(c):
+            i = U[c]
+            while i != c:
+                j = L[i]
+                while j != i:
+                    S[C[j]] += 1
+                    U[D[j]] = j
+                    D[U[j]] = j
+                    j = L[j]
+                i = U[i]
+            L[R[c]] = c
+            R[L[c]] = c
+
+        def select(n):
+            cover(C[n])
+            j = R[n]
+            while j != n:
+                cover(C[j])
+                j = R[j]
+
+        def unselect(n):
+            j = L[n]
+            while j != n:
+                uncover(C[j])
+                j = L[j]
+            uncover(C[n])
+
+        chosen = [] # selected nodes, the givens first
+        try:
+            for row in given:
+                n = j = matrix.first[row]
+                while True: # a column covered already means a conflict
+                    if R[L[C[j]]] != C[j]:
+                        return
+                    j = R[j]
+                    if j == n:
+                        break
+                select(n)
+                chosen.append(n)
+            start = len(chosen)
+
+            size = matrix.size
+            rng = self.rng
+            deadline = self.deadline
+            firsts = [] # the first tried row of every searched column
+            while True:
+                if self.cancelled:
+                    raise SolverCancelled()
+                if deadline is not None and timer() > deadline:
+                    raise SolverTimeout('no solution within %gs' % self.timeout)
+                if self.budget is not None and \
+                        self.backtracks >= self.budget:
+                    raise SearchRestart()
+                if R[0] == 0: # every constraint is met
+                    cells = [0] * (size * size)
+                    for n in chosen:
+                        row = matrix.row[n]
+                        cells[row // size] = row % size + 1
+                    yield [cells[r*size:r*size + size] for r in range(size)]
+                else:
+                    # the column with the fewest rows
+                    best = c = R[0]
+                    fewest = S[c]
+                    ties = 1
+                    while c and fewest > 1:
+                        if S[c] < fewest:
+                            best, fewest = c, S[c]
+                            ties = 1
+                        elif rng is not None and S[c] == fewest:
+                            ties += 1
+                            if rng.random() * ties < 1:
+                                best = c
+                        c = R[c]
+                    if fewest:
+                        n = D[best]
+                        if rng is not None:
+                            for k in range(rng.randrange(fewest)):
+                                n = D[n]
+                        firsts.append(n)
+                        select(n)
+                        chosen.append(n)
+                        self.nodes += 1
+                        continue
+
+                # try the next row of the latest column, backtrack
+                # where there is none
+                while len(chosen) > start:
+                    n = chosen.pop()
+                    unselect(n)
+                    self.backtracks += 1
+                    n = D[n]
+                    if n == C[n]:
+                        n = D[n]
+                    if n != firsts[-1]:
+                        select(n)
+                        chosen.append(n)
+                        self.nodes += 1
+                        break
+                    firsts.pop()
+                else:
+                    return
+        finally:
+            while chosen:
+                unselect(chosen.pop())
+            matrix.busy = False
+
+
+class PrologWorker(object):
+    '''
+    A long-lived swipl process which has loaded sudoku.pro once
+    and solves problems sent over its stdin/stdout pipes.
+    '''
+    def __init__(self, program=PROGRAM):
+        self.program = program
+        self.process = None
+        self.buffer = b''
+        self.last_used = 0
+        self.write_seconds = 0.0 # sending the latest term took this long
+
+    def start(self):
+        '''
+        starts the interpreter, kills a running one first
+        '''
+        self.stop()
+        self.process = subprocess.Popen(
+            ['swipl', '-q', '-f', self.program, '-g', 'serve', '-t', 'halt'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.buffer = b''
+        self.last_used = time.time()
+
+    def stop(self):
+        '''
+        kills the interpreter
+        '''
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def kill(self):
+        '''
+        kills the interpreter from another thread, a waiting ask()
+        then raises EOFError
+        '''
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.kill()
+
+    def ask(self, term, timeout):
+        '''
+        sends term to the interpreter and returns its answer line,
+        raises SolverTimeout if there is no answer within timeout seconds
+        '''
+        if not self.alive():
+            self.start()
+        start = timer()
+        self.process.stdin.write(term.encode('ascii') + b'.\n')
+        self.process.stdin.flush()
+        self.write_seconds = timer() - start
+        self.last_used = time.time()
+        return self.readLine(timeout)
+
+    def readLine(self, timeout):
+        '''
+        reads one line from the interpreter without blocking
+        longer than timeout seconds
+        '''
+        fd = self.process.stdout.fileno()
+        deadline = time.time() + timeout
+
+        while b'\n' not in self.buffer:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise SolverTimeout('swipl did not answer within %gs' % timeout)
+            data = os.read(fd, 4096)
+            if not data: # the interpreter died
+                raise EOFError('swipl exited')
+            self.buffer += data
+
+        line, self.buffer = self.buffer.split(b'\n', 1)
+        return line.decode('ascii').strip()
+
+    def ping(self, timeout=1.0):
+        '''
+        returns True when the interpreter is alive and answers
+        '''
+        try:
+            return self.alive() and self.ask('ping', timeout) == 'pong'
+        except (SolverTimeout, EOFError, IOError, OSError):
+            return False
+
+
+def prologTerm(grid):
+    '''
+    returns the grid as a prolog list of rows, 0 for empty fields
+    '''
+    return '[' + ','.join('[' + ','.join(str(d) for d in row) + ']'
+                          for row in grid) + ']'
+
+
+def parseAnswer(answer):
+    '''
+    returns the solved grid of an answer line of the serve/0 loop,
+    None for 'none'
+    '''
+    if answer == 'none':
+        return None
+    digits = [int(d) for d in re.findall('[0-9]+', answer)]
+    size = int(round(len(digits) ** 0.5))
+    if answer == 'error' or not digits or size * size != len(digits):
+        raise ValueError('swipl could not handle the problem: %r' % answer)
+    return [digits[r*size:r*size + size] for r in range(size)]
+
+
+class PrologSolver(Solver):
+    '''
+    Solves with a fresh swipl interpreter and sudoku.pro per problem.
+    Problem and solution are exchanged over pipes, no files are written.
+    '''
+    name = 'prolog'
+    counted = ('io_seconds',)
+
+    def __init__(self, timeout=30.0, program=PROGRAM):
+        self.timeout = timeout
+        self.program = program
+        self.worker = None
+
+    @classmethod
+    def available(cls):
+        for path in os.environ.get('PATH', '').split(os.pathsep):
+            if os.path.exists(os.path.join(path, 'swipl')):
+                return True
+        return False
+
+    def solve(self, grid):
+        self.cancelled = False
+        # call the interpreter and let him solve it!
+        self.worker = worker = PrologWorker(self.program)
+        try:
+            start = timer()
+            term = prologTerm(grid)
+            self.io_seconds = timer() - start
+            answer = worker.ask(term, self.timeout)
+            start = timer()
+            solution = parseAnswer(answer)
+            self.io_seconds += timer() - start + worker.write_seconds
+            return solution
+        except (EOFError, IOError, OSError):
+            if self.cancelled:
+                raise SolverCancelled()
+            raise
+        finally:
+            self.worker = None
+            worker.stop()
+
+    def cancel(self):
+        self.cancelled = True
+        worker = self.worker
+        if worker is not None:
+            worker.kill()
+
+
+class PrologPool(Solver):
+    '''
+    Solves with a pool of persistent swipl workers, so the interpreter
+    start and the clpfd load are paid once per worker, not per problem.
+    Dead or hanging workers are restarted, a background thread checks
+    the idle ones every idle_check seconds until close().
+    '''
+    name = 'prolog-pool'
+    counted = ('io_seconds',)
+
+    def __init__(self, size=2, timeout=30.0, idle_check=60.0, program=PROGRAM):
+        self.size = size
+        self.timeout = timeout
+        self.idle_check = idle_check # ping workers idle for longer than this
+        self.workers = [PrologWorker(program) for i in range(size)]
+        self.busy = set()
+        self.idle = queue.Queue()
+        for worker in self.workers:
+            self.idle.put(worker)
+        self.lock = threading.Lock() # close() waits for a running check
+        self.closed = threading.Event()
+        _pools.add(self)
+        if idle_check:
+            watcher = threading.Thread(target=_watchPool,
+                args=(weakref.ref(self), self.closed, idle_check))
+            watcher.daemon = True
+            watcher.start()
+
+    @classmethod
+    def available(cls):
+        return PrologSolver.available()
+
+    def solve(self, grid):
+        self.cancelled = False
+        worker = self.idle.get()
+        self.busy.add(worker)
+        try:
+            if worker.alive() and time.time() - worker.last_used > self.idle_check:
+                if not worker.ping():
+                    worker.start()
+            start = timer()
+            term = prologTerm(grid)
+            self.io_seconds = timer() - start
+            try:
+                answer = worker.ask(term, self.timeout)
+            except EOFError: # the worker died, try once more with a new one
+                if self.cancelled:
+                    raise SolverCancelled()
+                worker.start()
+                answer = worker.ask(term, self.timeout)
+        except:
+            worker.stop() # a new worker is started on the next request
+            if self.cancelled:
+                raise SolverCancelled()
+            raise
+        finally:
+            self.busy.discard(worker)
+            self.idle.put(worker)
+
+        start = timer()
+        solution = parseAnswer(answer)
+        self.io_seconds += timer() - start + worker.write_seconds
+        return solution
+
+    def cancel(self):
+        self.cancelled = True
+        for worker in list(self.busy):
+            worker.kill()
+
+    def checkHealth(self):
+        '''
+        pings all idle workers and restarts the ones not answering,
+        returns the number of restarted workers
+        '''
+        restarted = 0
+        with self.lock:
+            for i in range(self.size):
+                if self.closed.is_set():
+                    break
+                try:
+                    worker = self.idle.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    if worker.process is not None and not worker.ping():
+                        worker.start()
+                        restarted += 1
+                finally:
+                    self.idle.put(worker)
+        return restarted
+
+    def close(self):
+        '''
+        stops the health checks and all workers
+        '''
+        self.closed.set()
+        with self.lock:
+            for worker in self.workers:
+                worker.stop()
+
+
+# the open pools, their workers are stopped when python exits
+_pools = weakref.WeakSet()
+
+def _closePools():
+    for pool in list(_pools):
+        pool.close()
+
+atexit.register(_closePools)
+
+
+def _watchPool(ref, closed, interval):
+    '''
+    runs checkHealth() of the pool behind the weak reference ref every
+    interval seconds, until closed is set or the pool is gone
+    '''
+    while not closed.wait(interval):
+        pool = ref()
+        if pool is None:
+            return
+        pool.checkHealth()
+        pool = None
+
+
+SOLVERS = {
+    NativeSolver.name: NativeSolver,
+    DLXSolver.name: DLXSolver,
+    PrologSolver.name: PrologSolver,
+    PrologPool.name: PrologPool,
+}
+
+def getSolver(name='native'):
+    '''
+    returns a new solver for the backend name
+    '''
+    if name not in SOLVERS:
+        raise ValueError('unknown solver: %s' % name)
+    return SOLVERS[name]()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+'''
+Instrumentation of the solve path: what solving cost and where the
+time went.
+
+    solver = InstrumentedSolver(solvers.getSolver('native'))
+    solver.solve(grid)
+    print(solver.last.summary())
+'''
+
+import json, time, cProfile
+from solvers import Solver
+
+try:
+    timer = time.perf_counter
+except AttributeError: # python 2
+    timer = time.time
+
+
+class SolveStats(object):
+    '''
+    The cost of one solve, or of many added up: wall time, the part of it
+    spent on serializing and exchanging the problem (Prolog backends),
+    search nodes, backtracks, propagation rounds and how often every
+    propagation technique fired. Counters a backend does not keep stay 0.
+    '''
+    def __init__(self, solver=None):
+        self.solver = solver
+        self.solves = 0
+        self.solved = 0
+        self.seconds = 0.0
+        self.io_seconds = 0.0
+        self.nodes = 0
+        self.backtracks = 0
+        self.rounds = 0
+        self.techniques = {}
+
+    def record(self, solver, seconds, solved):
+        '''
+        adds a solve of solver which took seconds,
+        the counters come from the solver's latest search
+        '''
+        self.solves += 1
+        self.solved += bool(solved)
+        self.seconds += seconds
+        self.io_seconds += solver.io_seconds
+        self.nodes += solver.nodes
+        self.backtracks += solver.backtracks
+        self.rounds += solver.rounds
+        for name, count in (solver.techniques or {}).items():
+            self.techniques[name] = self.techniques.get(name, 0) + count
+
+    def add(self, other):
+        '''
+        adds the stats of other to these
+        '''
+        for name in ('solves', 'solved', 'seconds', 'io_seconds', 'nodes',
+                     'backtracks', 'rounds'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name, count in other.techniques.items():
+            self.techniques[name] = self.techniques.get(name, 0) + count
+
+    def asDict(self):
+        return {
+            'solver': self.solver,
+            'solves': self.solves,
+            'solved': self.solved,
+            'seconds': self.seconds,
+            'io_seconds': self.io_seconds,
+            'nodes': self.nodes,
+            'backtracks': self.backtracks,
+            'rounds': self.rounds,
+            'techniques': dict(self.techniques),
+        }
+
+    def toJSON(self):
+        return json.dumps(self.asDict(), sort_keys=True)
+
+    def summary(self):
+        '''
+        returns the stats as one line of text
+        '''
+        text = '%s: %d solves in %.2f ms (I/O %.2f ms), %d nodes, ' \
+            '%d backtracks, %d rounds' % (self.solver, self.solves,
+            self.seconds * 1000, self.io_seconds * 1000, self.nodes,
+            self.backtracks, self.rounds)
+        fired = ['%s %d' % item for item in sorted(self.techniques.items())
+                 if item[1]]
+        if fired:
+            text += ' (%s)' % ', '.join(fired)
+        return text
+
+
+class InstrumentedSolver(Solver):
+    '''
+    Measures every solve of the wrapped solver: self.last holds the stats
+    of the latest one, self.total all of them added up. With profile set
+    the solves also run under cProfile, dumpProfile() writes what it
+    collected in the pstats format (python -m pstats, snakeviz, ...).
+    '''
+    def __init__(self, solver, profile=False):
+        self.solver = solver
+        self.name = solver.name
+        self.counted = solver.counted
+        self.last = SolveStats(self.name)
+        self.total = SolveStats(self.name)
+        self.profiler = cProfile.Profile() if profile else None
+
+    def available(self):
+        return self.solver.available()
+
+    def solve(self, grid):
+        solution = None
+        if self.profiler is not None:
+            self.profiler.enable()
+        start = timer()
+        try:
+            solution = self.solver.solve(grid)
+            return solution
+        finally:
+            seconds = timer() - start
+            if self.profiler is not None:
+                self.profiler.disable()
+            self.last = SolveStats(self.name)
+            self.last.record(self.solver, seconds, solution is not None)
+            self.total.add(self.last)
+
+    def cancel(self):
+        self.solver.cancel()
+
+    def close(self):
+        if hasattr(self.solver, 'close'):
+            self.solver.close()
+
+    def dumpProfile(self, path):
+        '''
+        writes the profile of all solves so far to path
+        '''
+        if self.profiler is not None:
+            self.profiler.dump_stats(path)
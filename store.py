@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+'''
+A compact binary store of puzzles, read through mmap.
+
+The file starts with a header of 16 bytes:
+
+    magic 'SDKB', version, block size, flags, 0, number of records (uint64)
+
+followed by records of a fixed size, so record i is found at once:
+
+    puzzle      fields row by row, two per byte (4 bit) for 4x4 and 9x9,
+                one per byte for larger boards, 0 for empty fields
+    solution    the same, all 0 if there is none      (flag 1)
+    difficulty  0 unknown, 1 easy, 2 medium, 3 hard   (flag 2)
+    time        seconds to solve, float32             (flag 4)
+
+All numbers are little-endian.
+
+    python store.py pack corpus.txt corpus.sdb --solve --grade
+    python store.py unpack corpus.sdb corpus.txt
+    python store.py info corpus.sdb
+'''
+
+import sys, mmap, struct, time, argparse
+import solvers, puzzles
+from solvers import layout
+from generator import DIFFICULTIES, grade
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    timer = time.perf_counter
+except AttributeError: # python 2
+    timer = time.time
+
+MAGIC = b'SDKB'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBQ')
+
+SOLUTION, DIFFICULTY, TIME = 1, 2, 4
+TIME_FORMAT = struct.Struct('<f')
+
+
+def cellBytes(box):
+    '''
+    returns the bytes one grid of block size box takes
+    '''
+    cells = layout(box).cells
+    return (cells + 1) // 2 if box < 4 else cells
+
+
+def recordSize(box, flags):
+    size = cellBytes(box)
+    if flags & SOLUTION:
+        size += cellBytes(box)
+    if flags & DIFFICULTY:
+        size += 1
+    if flags & TIME:
+        size += TIME_FORMAT.size
+    return size
+
+
+def pack(grid, box):
+    '''
+    returns the fields of grid as bytes of the store
+    '''
+    cells = bytearray(d for row in grid for d in row)
+    if box >= 4:
+        return bytes(cells)
+    if len(cells) % 2:
+        cells.append(0)
+    return bytes(bytearray(cells[i] << 4 | cells[i + 1]
+                           for i in range(0, len(cells), 2)))
+
+
+def unpack(data, box):
+    '''
+    returns the grid of bytes of the store
+    '''
+    size = box * box
+    data = bytearray(data)
+    if box < 4:
+        cells = bytearray()
+        for b in data:
+            cells.append(b >> 4)
+            cells.append(b & 15)
+    else:
+        cells = data
+    return [list(cells[r*size:r*size + size]) for r in range(size)]
+
+
+class StoreWriter(object):
+    '''
+    Writes a store record by record, the number of records
+    goes into the header on close().
+    '''
+    def __init__(self, path, box=3, flags=0):
+        self.box = box
+        self.flags = flags
+        self.count = 0
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, box, flags, 0, 0))
+
+    def add(self, grid, solution=None, difficulty=None, seconds=None):
+        if len(grid) != self.box * self.box:
+            raise ValueError('not a grid of block size %d' % self.box)
+        record = [pack(grid, self.box)]
+        if self.flags & SOLUTION:
+            if solution is None:
+                record.append(bytes(bytearray(cellBytes(self.box))))
+            else:
+                record.append(pack(solution, self.box))
+        if self.flags & DIFFICULTY:
+            level = DIFFICULTIES.index(difficulty) + 1 if difficulty else 0
+            record.append(bytes(bytearray([level])))
+        if self.flags & TIME:
+            record.append(TIME_FORMAT.pack(seconds or 0.0))
+        self.file.write(b''.join(record))
+        self.count += 1
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.box, self.flags, 0,
+                                    self.count))
+        self.file.close()
+
+
+class PuzzleStore(object):
+    '''
+    Read access to a store through mmap, store[i] is the grid of
+    record i and store[a:b] the puzzles a to b as uint8 array
+    (puzzles x fields, needs numpy), e.g. for batch.solveChunks.
+    Arrays of records() and puzzles() may be views of the mapped file;
+    close() leaves the mapping to them then, it is unmapped when the
+    last of them is gone. Stores can be used in a with statement.
+    '''
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            raise ValueError('%s is no puzzle store' % path)
+        magic, version, self.box, self.flags, _, self.count = \
+            HEADER.unpack(self.map[:HEADER.size])
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is no puzzle store of version %d'
+                             % (path, VERSION))
+        self.record_size = recordSize(self.box, self.flags)
+        if len(self.map) < HEADER.size + self.count * self.record_size:
+            raise ValueError('%s is truncated' % path)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.count)
+            if step != 1:
+                raise ValueError('only slices with step 1')
+            return self.puzzles(start, stop)
+        return self.puzzle(index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        try:
+            self.map.close()
+        except BufferError: # numpy views of the map are still alive
+            pass
+        self.file.close()
+
+    def _field(self, index, offset, length):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('record %d of %d' % (index, self.count))
+        start = HEADER.size + index * self.record_size + offset
+        return self.map[start:start + length]
+
+    def puzzle(self, index):
+        return unpack(self._field(index, 0, cellBytes(self.box)), self.box)
+
+    def solution(self, index):
+        '''
+        returns the solution of record index, None if there is none
+        '''
+        if not self.flags & SOLUTION:
+            return None
+        n = cellBytes(self.box)
+        data = self._field(index, n, n)
+        if not any(bytearray(data)):
+            return None
+        return unpack(data, self.box)
+
+    def difficulty(self, index):
+        if not self.flags & DIFFICULTY:
+            return None
+        offset = cellBytes(self.box) * (2 if self.flags & SOLUTION else 1)
+        level = bytearray(self._field(index, offset, 1))[0]
+        return DIFFICULTIES[level - 1] if level else None
+
+    def seconds(self, index):
+        '''
+        returns the time solving record index took, None if not stored
+        '''
+        if not self.flags & TIME:
+            return None
+        offset = self.record_size - TIME_FORMAT.size
+        return TIME_FORMAT.unpack(self._field(index, offset,
+                                              TIME_FORMAT.size))[0]
+
+    def records(self):
+        '''
+        returns all records as a numpy structured array which maps
+        the file, slicing it copies nothing
+        '''
+        n = cellBytes(self.box)
+        fields = [('puzzle', numpy.uint8, (n,))]
+        if self.flags & SOLUTION:
+            fields.append(('solution', numpy.uint8, (n,)))
+        if self.flags & DIFFICULTY:
+            fields.append(('difficulty', numpy.uint8))
+        if self.flags & TIME:
+            fields.append(('time', '<f4'))
+        return numpy.frombuffer(self.map, dtype=numpy.dtype(fields),
+                                count=self.count, offset=HEADER.size)
+
+    def puzzles(self, start=0, stop=None, field='puzzle'):
+        '''
+        returns the puzzles (or solutions) of records start to stop
+        as uint8 array (puzzles x fields); for 16x16 and larger boards
+        this is a view of the file, 4 bit fields are unpacked
+        '''
+        data = self.records()[field][start:stop]
+        if self.box >= 4:
+            return data
+        cells = layout(self.box).cells
+        grids = numpy.empty((len(data), 2 * data.shape[1]), dtype=numpy.uint8)
+        grids[:, 0::2] = data >> 4
+        grids[:, 1::2] = data & 15
+        return grids[:, :cells]
+
+
+def packText(names, path, box=3, solve=False, difficulty=False):
+    '''
+    converts the puzzle text files names into a store at path,
+    with solve the solutions and solving times are stored too, with
+    difficulty the difficulty of uniquely solvable puzzles;
+    returns the number of records
+    '''
+    flags = (SOLUTION | TIME if solve else 0) | (DIFFICULTY if difficulty else 0)
+    solver = solvers.NativeSolver()
+    writer = StoreWriter(path, box, flags)
+    try:
+        for name in names:
+            file = puzzles.openPuzzles(name)
+            for number, grid in puzzles.readPuzzles(file):
+                if isinstance(grid, ValueError):
+                    raise ValueError('%s, line %d: %s' % (name, number, grid))
+                solution = seconds = level = None
+                if solve:
+                    start = timer()
+                    solution = solver.solve(grid)
+                    seconds = timer() - start
+                if difficulty and solver.count(grid, 2) == 1:
+                    level = grade(grid, solver)
+                writer.add(grid, solution, level, seconds)
+            if file is not sys.stdin:
+                file.close()
+    finally:
+        writer.close()
+    return writer.count
+
+
+def unpackText(path, out, solutions=False):
+    '''
+    writes the puzzles (or the solutions, 'none' for missing ones)
+    of the store at path to the file out, one per line
+    '''
+    with PuzzleStore(path) as store:
+        for i in range(len(store)):
+            grid = store.solution(i) if solutions else store.puzzle(i)
+            out.write(puzzles.formatGrid(grid) + '\n' if grid else 'none\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Converts puzzles between '
+        'text files and the binary puzzle store.')
+    commands = parser.add_subparsers(dest='command')
+    command = commands.add_parser('pack', help='text files to a store')
+    command.add_argument('files', nargs='+', help='puzzle files, - for stdin')
+    command.add_argument('store')
+    command.add_argument('-b', '--box', type=int, default=3,
+        help='block size, 3 for 9x9, 4 for 16x16, 5 for 25x25')
+    command.add_argument('--solve', action='store_true',
+        help='store solutions and solving times')
+    command.add_argument('--grade', action='store_true',
+        help='store difficulties')
+    command = commands.add_parser('unpack', help='a store to text')
+    command.add_argument('store')
+    command.add_argument('output', nargs='?', default='-')
+    command.add_argument('--solutions', action='store_true',
+        help='write the solutions instead of the puzzles')
+    command = commands.add_parser('info', help='describe a store')
+    command.add_argument('store')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'pack':
+            count = packText(args.files, args.store, args.box, args.solve,
+                             args.grade)
+            sys.stderr.write('%d puzzles\n' % count)
+        elif args.command == 'unpack':
+            out = sys.stdout if args.output == '-' else open(args.output, 'w')
+            unpackText(args.store, out, args.solutions)
+            if out is not sys.stdout:
+                out.close()
+        elif args.command == 'info':
+            with PuzzleStore(args.store) as store:
+                size = store.box * store.box
+                sys.stdout.write('%d puzzles of %dx%d, %d bytes each%s%s%s\n'
+                    % (len(store), size, size, store.record_size,
+                    ', solutions' if store.flags & SOLUTION else '',
+                    ', difficulties' if store.flags & DIFFICULTY else '',
+                    ', solving times' if store.flags & TIME else ''))
+        else:
+            parser.error('a command is needed')
+    except (IOError, ValueError) as error:
+        sys.stderr.write('%s\n' % error)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
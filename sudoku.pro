@@ -1,28 +1,52 @@
 :- use_module(library(clpfd)).
 
-% shorthand for printing the solution of problem X
-sud(O) :-
-  open(O, write, OF),
-  problem(1, Rows), sudoku(Rows), maplist(write(OF), Rows),
-  close(OF).
+% serves problems from standard input until end of file, one term per line:
+% a list of rows with 0 for empty fields is answered with the solved rows
+% or 'none', 'ping' is answered with 'pong'
+serve :-
+  prompt(_, ''),
+  repeat,
+    read_term(user_input, T, []),
+    ( T == end_of_file -> !
+    ; catch(answer(T), _, writeln(error)), flush_output, fail ).
 
-% sudoku solving:
+answer(ping) :- !, writeln(pong).
+answer(Problem) :-
+  maplist(maplist(blank), Problem, Rows),
+  ( sudoku(Rows) -> write_canonical(Rows), nl ; writeln(none) ).
+
+blank(0, _) :- !.
+blank(D, D).
+
+% sudoku solving, for N x N boards with blocks of size B x B, N = B*B:
 sudoku(Rows) :-
-  % Rows is a list of the list Vs
-  % where Vs contains values from 1 to 9
-  append(Rows, Vs), Vs ins 1..9,
+  % Rows is a list of N lists, which together form the list Vs
+  % where Vs contains values from 1 to N
+  length(Rows, N), B is truncate(sqrt(N)), B*B =:= N,
+  append(Rows, Vs), Vs ins 1..N,
   % all values in the lists in Rows have to be distinct
   maplist(all_distinct, Rows),
   % split up Rows into Columns and check them
   transpose(Rows, Columns), maplist(all_distinct, Columns),
-  % check the blocks
-  Rows = [A,B,C,D,E,F,G,H,I],
-  blocks(A, B, C), blocks(D, E, F), blocks(G, H, I),
-  % force a definite value for every variable in Rows
-  maplist(label, Rows).
+  % check the blocks, band by band
+  bands(Rows, B),
+  % force a definite value for every variable, the most constrained first
+  labeling([ff], Vs).
 
-blocks([], [], []).
-blocks([A,B,C|Bs1], [D,E,F|Bs2], [G,H,I|Bs3]) :-
+bands([], _) :- !.
+bands(Rows, B) :-
+  % the first B rows form a band of N/B blocks
+  length(Band, B), append(Band, Rest, Rows),
+  blocks(Band, B),
+  bands(Rest, B).
+
+blocks(Band, _) :- maplist(=([]), Band), !.
+blocks(Band, B) :-
+  % the first B fields of every row in Band form a block,
   % all values in a block are distinct
-  all_distinct([A,B,C,D,E,F,G,H,I]),
-  blocks(Bs1, Bs2, Bs3).
+  maplist(split(B), Band, Block, Rests),
+  append(Block, Vs), all_distinct(Vs),
+  blocks(Rests, B).
+
+split(B, Row, First, Rest) :-
+  length(First, B), append(First, Rest, Row).
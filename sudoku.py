@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 
 from PyQt4 import QtCore, QtGui
-import sys, os
-
-SOLUTION = 'solution.txt'
-PROBLEM = 'sudoku_problem.pro'
+import sys
+import solvers
+from puzzles import DIGITS
+from cache import CachedSolver
+from stats import InstrumentedSolver
+from board import Board
+from hints import HintSession
+from generator import PuzzlePool, difficulties
 
 class SudokuWindow(QtGui.QMainWindow):
     '''
@@ -21,6 +25,18 @@ class SudokuWindow(QtGui.QMainWindow):
         
         self.setWindowTitle('Brain\'ovation - Sudoku')
         
+        self.solver = InstrumentedSolver(solvers.getSolver('native'))
+        self.show_stats = False # stats of every solve in the status bar
+        self.timeout = 10 # seconds until a running solver is cancelled
+        self.thread = None # the running SolveThread
+        self.howto = None # the SudokuHowtoWindow, built when first shown
+        self.difficulty = 'medium' # of new puzzles, None for an empty field
+        self.box = 3 # block size, 3 for 9x9, 4 for 16x16, 5 for 25x25
+        self.pencil = False # show the candidates of empty fields
+        self.pools = {} # the PuzzlePool of the difficulty and block size
+        self.getPool(self.difficulty)
+        self.difficulty_actions = {} # menu entries by difficulty
+        
         self.createContent()
         self.createMenus()
 
@@ -29,8 +45,8 @@ class SudokuWindow(QtGui.QMainWindow):
         Creates the content of the Sudoku window.
         Such as buttons and the Sudoku-field.
         '''
-        # Sudoku field
-        field = SudokuField(self)
+        # Sudoku field, replaced by setBox()
+        self.field = SudokuField(self, self.box)
         
         # buttons
         button_solve = QtGui.QPushButton('Lösen', self)
@@ -38,98 +54,85 @@ class SudokuWindow(QtGui.QMainWindow):
         button_next = QtGui.QPushButton('-->', self)
         button_new = QtGui.QPushButton('Neu', self)
         
-        def removeFiles():
+        def solve(then):
             '''
-            removes our temporary files
+            asks the hint session for the solution, the solver only runs
+            (in the background) when the board changed in a conflicting way
+            calls then() when it's solvable
             '''
-            # if we call removeFiles just for one file
-            if os.path.exists(SOLUTION) == True:
-                os.remove(SOLUTION)
-            if os.path.exists(PROBLEM) == True:
-                os.remove(PROBLEM)
+            # nothing to do if the problem is already solved:
+            if self.field.board.isFull():
+                msg_box = QtGui.QMessageBox.question(self, 'Sudoku - Fehler',
+                    'Diese Aufgabe ist bereits komplett gelöst!',
+                    QtGui.QMessageBox.Ok)
+                return
+            
+            # the board knows its conflicts, no need to ask the solver
+            if self.field.board.hasConflicts():
+                msg_box = QtGui.QMessageBox.question(self, 'Sudoku - Fehler',
+                    'Eine Ziffer steht doppelt in einer Zeile, Spalte\n' +
+                    'oder einem Block, die Felder sind rot markiert.',
+                    QtGui.QMessageBox.Ok)
+                return
             
-        def solve():
+            if self.field.hints.isKnown():
+                solved(self.field.hints.solution(), then)
+            else:
+                self.solveInBackground(self.field.getProblem(),
+                                       lambda solution: solved(solution, then))
+        
+        def solved(solution, then):
             '''
-            calls writeProblemToFile(file) and tries to solve
-            return True when it's solvable, and False when not
+            calls then() or tells the user that there is no solution
             '''
-            # returns False if the problem is already solved:
-            if field.writeProblemToFile(PROBLEM) == False:
+            if solution is None: # if there is no solution
                 msg_box = QtGui.QMessageBox.question(self, 'Sudoku - Fehler',
-                    'Diese Aufgabe ist bereits komplett gelöst!',
+                    'Die Aufgabenstellung ist nicht lösbar.\n' +
+                    'Sehen Sie sich bitte die Anleitung im Menü an.',
                     QtGui.QMessageBox.Ok)
-                removeFiles()
-                return False
             else:
-                # call the interpreter and let him solve it!                
-                os.system("swipl -f sudoku.pro -g \"consult('" + PROBLEM + "')," +
-                           "sud('" + SOLUTION + "'), halt; halt.\"")
-                
-                # check whether there is a solution from the interpreter
-                file = open(SOLUTION)
-                solution = file.read()
-                
-                if solution == '': # if there is no solution
-                    msg_box = QtGui.QMessageBox.question(self, 'Sudoku - Fehler',
-                        'Die Aufgabenstellung ist nicht lösbar.\n' +
-                        'Sehen Sie sich bitte die Anleitung im Menü an.',
-                        QtGui.QMessageBox.Ok)
-                    file.close()
-                    return False
-                else:
-                    file.close()
-                    return True
+                then()
         
         def solveAndFill():
             '''
             slot for button_execute
-            calls solve(), fillSolution(file) and removeFiles()
+            calls solve() and fillSolution()
             '''
-            if solve() == True: # is true when it just solved the problem
-                field.fillSolution(SOLUTION) # if so, fill it into the GUI
-                removeFiles()
+            solve(self.field.fillSolution) # if it is solvable fill it into the GUI
             
         def nextTip():
             '''
             slot for button_next
             fills in the solution for the next empty field
             '''
-            if solve() == True:
-                file = open(SOLUTION)
-                solution = file.read()
-                    
-                i = 1
-                
-                for j in range(9):
-                    for k in range(9):
-                        field.le_list[j][k].setReadOnly(True)
-                        if field.le_list[j][k].displayText() == '':
-                            field.le_list[j][k].setText(solution[i])
-                            field.le_list[j][k].setPalette(field.palette_red)
-                            field.le_list[j][k].is_calculated = True
-                            file.close()
-                            removeFiles()
-                            return
-                        i += 2
-                    i += 1
+            solve(showNextTip)
+        
+        def showNextTip():
+            '''
+            fills in the next hint from the solution
+            '''
+            i = self.field.hints.nextHint()
+            size = self.field.side
+            for j in range(i + 1):
+                self.field.le_list[j // size][j % size].setReadOnly(True)
+            self.field.updateFields([i])
     
         def prevTip():
             '''
             slot for button_prev
             deletes the solution from the latest calculated field
             '''
-            for i in range(8,-1,-1):  # range from 8-0
-                for j in range(8,-1,-1):
-                    field.le_list[i][j].setReadOnly(False)
-                    if field.le_list[i][j].is_calculated == True:
-                        field.le_list[i][j].is_calculated = False;
-                        field.le_list[i][j].setText('')
-                        field.le_list[i][j].setPalette(field.palette_normal)
-                        return
+            i = self.field.hints.prevHint()
+            size = self.field.side
+            # range from the last field down to i
+            for j in range(size*size - 1, max(i, 0) - 1, -1):
+                self.field.le_list[j // size][j % size].setReadOnly(False)
+            if i >= 0:
+                self.field.updateFields([i])
 
         # connect buttons to their slots
         self.connect(button_solve, QtCore.SIGNAL('clicked()'), solveAndFill)
-        self.connect(button_new, QtCore.SIGNAL('clicked()'), field.clearLineEdits)
+        self.connect(button_new, QtCore.SIGNAL('clicked()'), self.newPuzzle)
         self.connect(button_next, QtCore.SIGNAL('clicked()'), nextTip)
         self.connect(button_prev, QtCore.SIGNAL('clicked()'), prevTip)
         
@@ -139,7 +142,7 @@ class SudokuWindow(QtGui.QMainWindow):
         grid = QtGui.QGridLayout()
         grid.setSpacing(10)
         
-        grid.addWidget(field, 0, 0, 1, 4, QtCore.Qt.AlignCenter)
+        grid.addWidget(self.field, 0, 0, 1, 4, QtCore.Qt.AlignCenter)
         grid.addWidget(button_solve, 1, 0)
         grid.addWidget(button_prev, 1, 1)
         grid.addWidget(button_next, 1, 2)
@@ -148,16 +151,302 @@ class SudokuWindow(QtGui.QMainWindow):
         content.setLayout(grid)
         self.setCentralWidget(content)
 
+    def solveInBackground(self, problem, then):
+        '''
+        solves problem in a SolveThread, so the window stays responsive,
+        shows a progress dialog with a cancel button for slow solvers and
+        cancels the solver after self.timeout seconds
+        calls then(solution) with the result if it was not cancelled
+        '''
+        if self.thread is not None: # still solving
+            return
+        
+        thread = SolveThread(self, self.solver, problem)
+        self.thread = thread
+        self.centralWidget().setEnabled(False)
+        
+        progress = QtGui.QProgressDialog('Die Aufgabe wird gelöst...',
+                                         'Abbrechen', 0, 0, self)
+        progress.setWindowTitle('Sudoku')
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        progress.setMinimumDuration(500) # only shown for slow solvers
+        
+        timer = QtCore.QTimer(self)
+        timer.setSingleShot(True)
+        timed_out = []
+        
+        def timeout():
+            timed_out.append(True)
+            thread.solver.cancel()
+        
+        def finish():
+            timer.stop()
+            progress.reset()
+            progress.deleteLater()
+            self.thread = None
+            self.centralWidget().setEnabled(True)
+        
+        def solved(solution):
+            finish()
+            self.field.hints.store(solution)
+            self.showStats()
+            then(solution)
+        
+        def cancelled():
+            finish()
+            if timed_out:
+                msg_box = QtGui.QMessageBox.question(self, 'Sudoku - Fehler',
+                    'Der Löser hat die Aufgabe nicht innerhalb von\n' +
+                    '%d Sekunden gelöst.' % self.timeout,
+                    QtGui.QMessageBox.Ok)
+        
+        def failed(message):
+            finish()
+            msg_box = QtGui.QMessageBox.question(self, 'Sudoku - Fehler',
+                'Der Löser ist fehlgeschlagen:\n' + message,
+                QtGui.QMessageBox.Ok)
+        
+        self.connect(thread, QtCore.SIGNAL('solved(PyQt_PyObject)'), solved)
+        self.connect(thread, QtCore.SIGNAL('cancelled()'), cancelled)
+        self.connect(thread, QtCore.SIGNAL('failed(PyQt_PyObject)'), failed)
+        self.connect(progress, QtCore.SIGNAL('canceled()'), thread.solver.cancel)
+        self.connect(timer, QtCore.SIGNAL('timeout()'), timeout)
+        self.connect(thread, QtCore.SIGNAL('finished()'), thread.deleteLater)
+        self.connect(thread, QtCore.SIGNAL('finished()'), timer.deleteLater)
+        
+        thread.start()
+        timer.start(self.timeout * 1000)
+    
+    def getPool(self, difficulty):
+        '''
+        returns the PuzzlePool of difficulty for the current block size,
+        it is started on first use; the pools of other difficulties and
+        sizes are stopped, so only one generates in the background
+        '''
+        key = (difficulty, self.box)
+        for other in list(self.pools):
+            if other != key:
+                self.pools.pop(other).stop()
+        if key not in self.pools:
+            self.pools[key] = PuzzlePool(difficulty, box=self.box)
+        return self.pools[key]
+    
+    def newPuzzle(self):
+        '''
+        slot for button_new
+        shows a new puzzle of the chosen difficulty or an empty field,
+        if none is ready yet it waits for the pool in a PuzzleThread
+        '''
+        if self.difficulty is None:
+            self.field.clearLineEdits()
+            return
+        if self.thread is not None: # still solving or waiting
+            return
+        pool = self.getPool(self.difficulty)
+        grid = pool.wait(0)
+        if grid is not None:
+            self.field.loadPuzzle(grid)
+            return
+        
+        thread = PuzzleThread(self, pool)
+        self.thread = thread
+        self.centralWidget().setEnabled(False)
+        
+        progress = QtGui.QProgressDialog('Eine neue Aufgabe wird erzeugt...',
+                                         'Abbrechen', 0, 0, self)
+        progress.setWindowTitle('Sudoku')
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        progress.setMinimumDuration(500)
+        
+        def finish():
+            progress.reset()
+            progress.deleteLater()
+            self.thread = None
+            self.centralWidget().setEnabled(True)
+        
+        def generated(grid):
+            finish()
+            self.field.loadPuzzle(grid)
+        
+        self.connect(thread, QtCore.SIGNAL('generated(PyQt_PyObject)'),
+                     generated)
+        self.connect(thread, QtCore.SIGNAL('cancelled()'), finish)
+        self.connect(progress, QtCore.SIGNAL('canceled()'), thread.cancel)
+        self.connect(thread, QtCore.SIGNAL('finished()'), thread.deleteLater)
+        thread.start()
+    
+    def setDifficulty(self, difficulty):
+        '''
+        slot for the difficulty menu
+        '''
+        self.difficulty = difficulty
+        if difficulty is not None:
+            self.getPool(difficulty) # start generating in the background
+    
+    def setBox(self, box):
+        '''
+        slot for the size menu
+        replaces the Sudoku field by an empty one of block size box
+        '''
+        if box == self.box or self.thread is not None:
+            return
+        self.box = box
+        grid = self.centralWidget().layout()
+        grid.removeWidget(self.field)
+        self.field.deleteLater()
+        self.field = SudokuField(self, box)
+        self.field.setPencilMarks(self.pencil)
+        grid.addWidget(self.field, 0, 0, 1, 4, QtCore.Qt.AlignCenter)
+        for difficulty, action in self.difficulty_actions.items():
+            action.setEnabled(difficulty is None or
+                              difficulty in difficulties(box))
+        if self.difficulty is not None and \
+                self.difficulty not in difficulties(box):
+            # the hardest difficulty left for this size
+            self.difficulty = difficulties(box)[-1]
+            self.difficulty_actions[self.difficulty].setChecked(True)
+        if self.difficulty is not None:
+            self.getPool(self.difficulty) # start generating in the background
+    
+    def setPencilMarks(self, on):
+        '''
+        slot for the candidates menu entry
+        '''
+        self.pencil = on
+        self.field.setPencilMarks(on)
+    
+    def setShowStats(self, on):
+        '''
+        slot for the stats menu entry
+        '''
+        self.show_stats = on
+        if on:
+            self.statusBar().show()
+            self.showStats()
+        else:
+            self.statusBar().hide()
+    
+    def showStats(self):
+        '''
+        shows what the latest solve cost in the status bar
+        '''
+        if not self.show_stats:
+            return
+        stats = self.solver.last
+        if not stats.solves:
+            self.statusBar().showMessage('Noch nichts gelöst.')
+            return
+        text = '%.1f ms (Ein-/Ausgabe %.1f ms), %d Knoten, %d Rücksprünge, ' \
+            '%d Runden' % (stats.seconds * 1000, stats.io_seconds * 1000,
+            stats.nodes, stats.backtracks, stats.rounds)
+        fired = ['%s %d' % item for item in sorted(stats.techniques.items())
+                 if item[1]]
+        if fired:
+            text += ' (%s)' % ', '.join(fired)
+        self.statusBar().showMessage(text)
+    
+    def setTimeout(self):
+        '''
+        slot for the timeout menu entry
+        '''
+        timeout, ok = QtGui.QInputDialog.getInteger(self, 'Sudoku - Zeitlimit',
+            'Sekunden bis der Löser abgebrochen wird:', self.timeout, 1, 3600)
+        if ok:
+            self.timeout = timeout
+    
+    def showHowto(self):
+        '''
+        slot for the howto menu entry, the window and its images
+        are only loaded when it is shown for the first time
+        '''
+        if self.howto is None:
+            self.howto = SudokuHowtoWindow(self)
+        self.howto.show()
+        self.howto.raise_()
+    
     def createMenus(self):
         '''
         Creates the menus of the Sudoku window.
         '''
-        # additional window
-        howto = SudokuHowtoWindow(self)
-
         # menubar
         menubar = self.menuBar()
-        menubar.addAction('&Anleitung', howto.show)
+        menubar.addAction('&Anleitung', self.showHowto)
+        
+        # difficulty of the puzzles 'Neu' shows
+        new_menu = menubar.addMenu('&Neu')
+        new_group = QtGui.QActionGroup(self)
+        
+        for difficulty, title in ((None, 'Leeres Feld'), ('easy', 'Leicht'),
+                                  ('medium', 'Mittel'), ('hard', 'Schwer')):
+            action = new_menu.addAction(title)
+            action.setCheckable(True)
+            action.setChecked(difficulty == self.difficulty)
+            action.setEnabled(difficulty is None or
+                              difficulty in difficulties(self.box))
+            new_group.addAction(action)
+            self.difficulty_actions[difficulty] = action
+            self.connect(action, QtCore.SIGNAL('triggered()'),
+                         lambda difficulty=difficulty: self.setDifficulty(difficulty))
+        
+        # size of the field
+        size_menu = menubar.addMenu('&Größe')
+        size_group = QtGui.QActionGroup(self)
+        
+        for box in (3, 4, 5):
+            action = size_menu.addAction('%d×%d' % (box*box, box*box))
+            action.setCheckable(True)
+            action.setChecked(box == self.box)
+            size_group.addAction(action)
+            self.connect(action, QtCore.SIGNAL('triggered()'),
+                         lambda box=box: self.setBox(box))
+        
+        # view
+        view_menu = menubar.addMenu('&Ansicht')
+        action = view_menu.addAction('&Kandidaten anzeigen')
+        action.setCheckable(True)
+        action.setChecked(self.pencil)
+        self.connect(action, QtCore.SIGNAL('toggled(bool)'), self.setPencilMarks)
+        action = view_menu.addAction('&Statistik des Lösers')
+        action.setCheckable(True)
+        action.setChecked(self.show_stats)
+        self.connect(action, QtCore.SIGNAL('toggled(bool)'), self.setShowStats)
+        
+        # solver backends, the native one is checked by default
+        solver_menu = menubar.addMenu('&Löser')
+        solver_group = QtGui.QActionGroup(self)
+        
+        for name, title in (('native', 'Python (schnell)'),
+                            ('dlx', 'Dancing Links (exakte Überdeckung)'),
+                            ('prolog', 'Prolog (swipl)'),
+                            ('prolog-pool', 'Prolog (swipl, dauerhaft)')):
+            action = solver_menu.addAction(title)
+            action.setCheckable(True)
+            action.setChecked(name == self.solver.name)
+            action.setEnabled(solvers.SOLVERS[name].available())
+            solver_group.addAction(action)
+            self.connect(action, QtCore.SIGNAL('triggered()'),
+                         lambda name=name: self.setSolver(name))
+        
+        solver_menu.addSeparator()
+        solver_menu.addAction('&Zeitlimit...', self.setTimeout)
+    
+    def setSolver(self, name):
+        '''
+        slot for the solver menu
+        switches the solver backend
+        '''
+        if name == self.solver.name:
+            return
+        solver = solvers.getSolver(name)
+        # the prolog backends solve slower than the canonical form is found
+        if name not in ('native', 'dlx'):
+            solver = CachedSolver(solver)
+        old = self.solver
+        self.solver = InstrumentedSolver(solver)
+        self.field.hints.setSolver(self.solver)
+        # a running solve of the old backend ends with cancelled()
+        old.cancel()
+        old.close()
         
                 
 class SudokuHowtoWindow(QtGui.QDialog):
@@ -295,10 +584,14 @@ class SudokuHowtoWindow(QtGui.QDialog):
 
 class SudokuField(QtGui.QWidget):
     '''
-    The Sudoku-field as a widget.
+    The Sudoku-field as a widget, box is the block size,
+    3 for the usual 9x9 field.
     '''
-    def __init__(self, parent):
+    def __init__(self, parent, box=3):
         QtGui.QWidget.__init__(self, parent)
+        
+        self.box = box
+        self.side = box * box # fields in a row or column
 
         # needed for sizeHint()
         self.screen = QtGui.QDesktopWidget().screenGeometry()
@@ -307,29 +600,48 @@ class SudokuField(QtGui.QWidget):
         sizePolicy.setHeightForWidth(True)
         self.setSizePolicy(sizePolicy)
 
+        self.board = Board(box=box) # the widgets are a view of the board
+        self.hints = HintSession(self.board, parent.solver)
+        self.pencil = False # show the candidates of empty fields
         self.le_list = []
         self.createGrid()
         
+        # resize events are coalesced, the fonts follow at most every 50 ms
+        self.font_size = None
+        self.grid_pixmap = None # the lines of the field, see paintEvent()
+        self.resize_timer = QtCore.QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.connect(self.resize_timer, QtCore.SIGNAL('timeout()'),
+                     self.updateLineEdits)
+        
         # our palettes, needed to set font color        
         self.palette_normal = self.le_list[0][0].palette()
         self.palette_red = self.le_list[0][0].palette()
         self.palette_red.setColor(self.palette_red.Text, QtGui.QColor("red"))
+        # and the background of conflicting digits
+        self.palette_conflict = self.le_list[0][0].palette()
+        self.palette_conflict.setColor(self.palette_conflict.Base,
+                                       QtGui.QColor(255, 190, 190))
         
     def createGrid(self):
         '''
         Creates the Sudoku-field with all lineedits.
         '''
-        for i in range(9):
+        for i in range(self.side):
             sublist = []
-            for j in range(9):
-                le = CustomLineEdit(self)
+            for j in range(self.side):
+                le = CustomLineEdit(self, self.box)
+                self.connect(le, QtCore.SIGNAL('textEdited(QString)'),
+                             lambda text, i=i, j=j: self.fieldEdited(i, j, text))
                 sublist.append(le)
             self.le_list.append(sublist)
                  
         grid = QtGui.QGridLayout()
         grid.setSpacing(15)
         
-        reg_exp = QtCore.QRegExp("[1-9]")
+        # digits above 9 are letters, A for 10 up to P for 25
+        digits = DIGITS[:self.side]
+        reg_exp = QtCore.QRegExp('[%s%s]' % (digits, digits[9:].lower()))
         validator = QtGui.QRegExpValidator(reg_exp, self)
         
         # dynamical size with self.size()       
@@ -337,67 +649,68 @@ class SudokuField(QtGui.QWidget):
         w = size.width()-2.5
         h = size.height()-2.5
         
-        # a list of coordinates to add the lineedits to the grid layout
-        pos =  [
-                [(0, 0), (0, 1), (0, 2), (0, 3), (0, 4), (0, 5), (0, 6), (0, 7), (0, 8)],
-                [(1, 0), (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (1, 7), (1, 8)],
-                [(2, 0), (2, 1), (2, 2), (2, 3), (2, 4), (2, 5), (2, 6), (2, 7), (2, 8)],
-                [(3, 0), (3, 1), (3, 2), (3, 3), (3, 4), (3, 5), (3, 6), (3, 7), (3, 8)],
-                [(4, 0), (4, 1), (4, 2), (4, 3), (4, 4), (4, 5), (4, 6), (4, 7), (4, 8)],
-                [(5, 0), (5, 1), (5, 2), (5, 3), (5, 4), (5, 5), (5, 6), (5, 7), (5, 8)],
-                [(6, 0), (6, 1), (6, 2), (6, 3), (6, 4), (6, 5), (6, 6), (6, 7), (6, 8)],
-                [(7, 0), (7, 1), (7, 2), (7, 3), (7, 4), (7, 5), (7, 6), (7, 7), (7, 8)],
-                [(8, 0), (8, 1), (8, 2), (8, 3), (8, 4), (8, 5), (8, 6), (8, 7), (8, 8)]
-               ]
-
-        for i in range(9):
-            for j in range(9):
+        for i in range(self.side):
+            for j in range(self.side):
                 self.le_list[i][j].setFrame(False)
                 self.le_list[i][j].setMaxLength(1)
                 self.le_list[i][j].setAlignment(QtCore.Qt.AlignCenter)
-                self.le_list[i][j].setSizeIncrement(w/9, h/9)
+                self.le_list[i][j].setSizeIncrement(w/self.side, h/self.side)
                 self.le_list[i][j].setSizePolicy(QtGui.QSizePolicy.Expanding,QtGui.QSizePolicy.Expanding)
                 self.le_list[i][j].setValidator(validator)
-                grid.addWidget(self.le_list[i][j], pos[i][j][0], pos[i][j][1])
+                grid.addWidget(self.le_list[i][j], i, j)
 
         self.setLayout(grid)
         
     def updateLineEdits(self):
         '''
-        Resizes font size.
+        Resizes font size, only when it changed.
         '''
         size = self.size()
         w = size.width()-2.5
         h = size.height()-2.5
         
-        if w < h:
-            self.font_size = w*0.04
-        else:
-            self.font_size = h*0.04
-            
-        font = QtGui.QFont('Serif', self.font_size)
+        # 4% of the field for 9x9, smaller for more fields
+        font_size = max(1, int(min(w, h)*0.36/self.side))
+        if font_size == self.font_size:
+            return
+        self.font_size = font_size
         
-        for i in range(9):
-            for j in range(9):
-                if self.le_list[i][j].is_calculated == True:
-                    self.le_list[i][j].setPalette(self.palette_red)
-                else:
-                    self.le_list[i][j].setPalette(self.palette_normal)
-                self.le_list[i][j].setFont(font)
+        # the LineEdits inherit the font of the field
+        self.setFont(QtGui.QFont('Serif', font_size))
         
     def resizeEvent(self, event):
         '''
         gets called when Window is resized
         '''
-        self.updateLineEdits()
+        self.grid_pixmap = None # drawn again for the new size
+        if self.font_size is None: # the first time, no waiting
+            self.updateLineEdits()
+        elif not self.resize_timer.isActive():
+            self.resize_timer.start(50)
     
     def paintEvent(self, event):
         '''
         gets called when painting has to be done
-        on creation, resize, ...
+        on creation, resize, every change of a LineEdit, ...
+        the lines only change with the size, so they are drawn once
+        into a pixmap which is copied from then on
         '''
+        if self.grid_pixmap is None:
+            self.grid_pixmap = self.drawGrid()
+        
         paint = QtGui.QPainter()
         paint.begin(self)
+        paint.drawPixmap(0, 0, self.grid_pixmap)
+        paint.end()
+    
+    def drawGrid(self):
+        '''
+        returns a transparent pixmap of the field's size with its lines
+        '''
+        pixmap = QtGui.QPixmap(self.size())
+        pixmap.fill(QtCore.Qt.transparent)
+        paint = QtGui.QPainter()
+        paint.begin(pixmap)
         
         #dynamical size with self.size()       
         size = self.size()
@@ -411,31 +724,23 @@ class SudokuField(QtGui.QWidget):
             pen = QtGui.QPen(QtCore.Qt.black, h*0.01, QtCore.Qt.SolidLine)
             smallpen = QtGui.QPen(QtCore.Qt.gray, h*0.005, QtCore.Qt.SolidLine)
                         
+        # thin lines between the fields, thick ones between the blocks
+        n = self.side
         paint.setPen(smallpen)
-        paint.drawLine(0, h/9, w, h/9)
-        paint.drawLine(0, 2*h/9, w, 2*h/9)
-        paint.drawLine(0, h/3+h/9, w, h/3+h/9)
-        paint.drawLine(0, h/3+2*h/9, w, h/3+2*h/9)
-        paint.drawLine(0, 2*h/3+h/9, w, 2*h/3+h/9)
-        paint.drawLine(0, 2*h/3+2*h/9, w, 2*h/3+2*h/9)
-        
-        paint.drawLine(w/9, 0, w/9, h)
-        paint.drawLine(2*w/9, 0, 2*w/9, h)
-        paint.drawLine(w/3+w/9, 0, w/3+w/9, h)
-        paint.drawLine(w/3+2*w/9, 0, w/3+2*w/9, h)
-        paint.drawLine(2*w/3+w/9, 0, 2*w/3+w/9, h)
-        paint.drawLine(2*w/3+2*w/9, 0, 2*w/3+2*w/9, h)
+        for k in range(1, n):
+            if k % self.box:
+                paint.drawLine(0, k*h/n, w, k*h/n)
+                paint.drawLine(k*w/n, 0, k*w/n, h)
         
         paint.setPen(pen)
-        paint.drawLine(0, h/3, w, h/3)
-        paint.drawLine(0, 2*h/3, w, 2*h/3)
-        
-        paint.drawLine(w/3, 0, w/3, h)
-        paint.drawLine(2*w/3, 0, 2*w/3, h)
+        for k in range(self.box, n, self.box):
+            paint.drawLine(0, k*h/n, w, k*h/n)
+            paint.drawLine(k*w/n, 0, k*w/n, h)
         
         paint.drawRect(1, 1, w, h)
         
         paint.end()
+        return pixmap
 
     def sizeHint(self):
         return QtCore.QSize(self.screen.width(), self.screen.height())
@@ -448,78 +753,176 @@ class SudokuField(QtGui.QWidget):
         slot for button_new
         clears all LineEdits
         '''
-        for i in range(9):
-            for j in range(9):
-                self.le_list[i][j].setText('')
+        self.hints.reset()
+        self.updateFields(self.board.clear())
+        for i in range(self.side):
+            for j in range(self.side):
                 self.le_list[i][j].setReadOnly(False)
-                self.le_list[i][j].is_calculated = False
-                self.le_list[i][j].setPalette(self.palette_normal)
-            
-    def writeProblemToFile(self, file):
+    
+    def loadPuzzle(self, grid):
         '''
-        writes the Sudoku problem in prolog-syntax to 'file'
+        clears the field and shows the puzzle grid
         '''
-        file = open(file, 'w')
-        file.write('problem(1,[')
-        
-        counter = 0
-        
-        for i in range(9):
-            file.write('[')
-            for j in range(9):
-                if self.le_list[i][j].displayText() == '':
-                    file.write('_')
-                else:
-                    counter += 1
-                    file.write(self.le_list[i][j].displayText())
-
-                if j != 8:
-                    file.write(',')
-            if i != 8:
-                 file.write('],\n')
-            else:
-                 file.write(']')
-        file.write(']).')
-        file.close()
-        
-        if counter == 81:
-            return False
+        self.clearLineEdits()
+        self.updateFields(self.board.load(grid))
+    
+    def fieldEdited(self, row, col, text):
+        '''
+        gets called when the user changes a LineEdit,
+        updates the board
+        '''
+        text = str(text).upper()
+        digit = DIGITS.index(text) + 1 if text else 0
+        self.board.set(row, col, digit)
+        self.hints.edited(row*self.side + col, digit)
+        self.updateMarks([row*self.side + col])
+    
+    def updateFields(self, indices):
+        '''
+        shows the board's digits of the fields in indices
+        '''
+        for i in indices:
+            le = self.le_list[i // self.side][i % self.side]
+            digit = self.board.cells[i]
+            le.setText(DIGITS[digit - 1] if digit else '')
+        self.updateMarks(indices)
+    
+    def updateMarks(self, indices):
+        '''
+        updates the conflict colors and the candidates of the fields in
+        indices and of their peers, the only fields a change there affects
+        '''
+        peers = self.board.layout.peers
+        fields = set(indices)
+        for i in indices:
+            fields.update(peers[i])
+        for i in fields:
+            self.updatePalette(i)
+            le = self.le_list[i // self.side][i % self.side]
+            marks = 0
+            if self.pencil and not self.board.cells[i]:
+                marks = self.board.candidates(i // self.side, i % self.side)
+            if marks != le.marks:
+                le.marks = marks
+                le.update()
+    
+    def updatePalette(self, i):
+        '''
+        colors field i: conflicting digits get a red background,
+        calculated ones a red font
+        '''
+        le = self.le_list[i // self.side][i % self.side]
+        if self.board.conflicts(i // self.side, i % self.side):
+            le.setPalette(self.palette_conflict)
+        elif self.board.calculated[i]:
+            le.setPalette(self.palette_red)
         else:
-            return True
-        
-    def fillSolution(self, file):
+            le.setPalette(self.palette_normal)
+    
+    def setPencilMarks(self, on):
+        '''
+        shows or hides the candidates of the empty fields
         '''
-        fills the GUI with the whole Solution from 'file'
+        self.pencil = on
+        self.updateMarks(range(len(self.board.cells)))
+            
+    def getProblem(self):
+        '''
+        returns the Sudoku problem as a list of rows, 0 for empty fields
         '''
-        file = open(file, 'r')
-        solution = file.read()
+        return self.board.grid()
         
-        i = 0
+    def fillSolution(self):
+        '''
+        fills the GUI with the whole solution
+        '''
+        self.updateFields(self.hints.fill())
+        for j in range(self.side):
+            for k in range(self.side):
+                self.le_list[j][k].setReadOnly(True)
 
-        for j in range(9):
-            if solution[i] == '[':
-                i += 1
-                for k in range(9):
-                    if self.le_list[j][k].displayText() == '':
-                        self.le_list[j][k].setText(solution[i])
-                        self.le_list[j][k].setPalette(self.palette_red)
-                        self.le_list[j][k].is_calculated = True
-                    self.le_list[j][k].setReadOnly(True)
-                    i += 2
-        file.close()
+
+class SolveThread(QtCore.QThread):
+    '''
+    Runs the solver outside of the GUI thread and delivers the result
+    through the signals solved(solution), cancelled() or failed(message).
+    '''
+    def __init__(self, parent, solver, problem):
+        QtCore.QThread.__init__(self, parent)
+        self.solver = solver
+        self.problem = problem
+    
+    def run(self):
+        try:
+            solution = self.solver.solve(self.problem)
+        except solvers.SolverCancelled:
+            self.emit(QtCore.SIGNAL('cancelled()'))
+        except Exception as error:
+            self.emit(QtCore.SIGNAL('failed(PyQt_PyObject)'), str(error))
+        else:
+            self.emit(QtCore.SIGNAL('solved(PyQt_PyObject)'), solution)
+
+
+class PuzzleThread(QtCore.QThread):
+    '''
+    Waits for the next puzzle of a PuzzlePool outside of the GUI thread
+    and delivers it through the signal generated(grid), or cancelled()
+    if cancel() was called before.
+    '''
+    def __init__(self, parent, pool):
+        QtCore.QThread.__init__(self, parent)
+        self.pool = pool
+        self.cancelled = False
+    
+    def cancel(self):
+        self.cancelled = True
+    
+    def run(self):
+        while not self.cancelled:
+            grid = self.pool.wait(0.1)
+            if grid is not None:
+                self.emit(QtCore.SIGNAL('generated(PyQt_PyObject)'), grid)
+                return
+        self.emit(QtCore.SIGNAL('cancelled()'))
 
 
 class CustomLineEdit(QtGui.QLineEdit):
     '''
-    Just contains a variable to check whether the
-    LineEdit is calculated by us
+    A LineEdit of the Sudoku-field, a view of one field of the board,
+    when empty it shows the candidates in marks as small digits
     '''
-    def __init__(self, parent):
+    def __init__(self, parent, box=3):
         QtGui.QLineEdit.__init__(self, parent)
-        self.is_calculated = False
+        
+        self.box = box
+        self.marks = 0 # bitmask of the candidates, bit d for digit d
+    
+    def paintEvent(self, event):
+        '''
+        draws the LineEdit and the candidates in a box x box grid
+        '''
+        QtGui.QLineEdit.paintEvent(self, event)
+        if not self.marks or self.text():
+            return
+        
+        paint = QtGui.QPainter()
+        paint.begin(self)
+        w = self.width() / float(self.box)
+        h = self.height() / float(self.box)
+        font = QtGui.QFont(self.font())
+        font.setPointSizeF(max(1.0, min(w, h) * 0.5))
+        paint.setFont(font)
+        paint.setPen(QtCore.Qt.gray)
+        for d in range(1, self.box * self.box + 1):
+            if self.marks & 1 << d:
+                r, c = divmod(d - 1, self.box)
+                paint.drawText(QtCore.QRectF(c*w, r*h, w, h),
+                               QtCore.Qt.AlignCenter, DIGITS[d - 1])
+        paint.end()
         
         
-app = QtGui.QApplication(sys.argv)
-mw = SudokuWindow()
-mw.show()
-sys.exit(app.exec_())
\ No newline at end of file
+if __name__ == '__main__':
+    app = QtGui.QApplication(sys.argv)
+    mw = SudokuWindow()
+    mw.show()
+    sys.exit(app.exec_())
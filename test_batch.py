@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the NumPy bulk solver and the memory-mapped text puzzles.
+
+    python -m unittest test_batch
+'''
+
+import os, shutil, tempfile, unittest
+import solvers, puzzles, generator, batch
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# propagation places the same digit twice in a unit by two hidden singles
+DUPLICATE_HIDDEN_SINGLES = '1002479000456000070000052080060500940007935100' \
+    '57010382400070000500008000098304000'
+
+
+def corpus(name):
+    file = puzzles.openPuzzles('corpora/%s.txt' % name)
+    grids = [grid for number, grid in puzzles.readPuzzles(file)]
+    file.close()
+    return grids
+
+
+def flat(grid):
+    return [d for row in grid for d in row]
+
+
+def contradictory(grid):
+    '''
+    returns grid with the first given of the first row repeated
+    in the first row
+    '''
+    grid = [row[:] for row in grid]
+    row = grid[0]
+    given = [c for c in range(len(row)) if row[c]]
+    row[given[1]] = row[given[0]]
+    return grid
+
+
+@unittest.skipIf(numpy is None, 'needs numpy')
+class SolveArrayTest(unittest.TestCase):
+    def setUp(self):
+        self.solver = solvers.NativeSolver()
+
+    def check(self, grids, box=3):
+        '''
+        asserts that solveArray() agrees with the native solver on grids
+        '''
+        solutions, solved, guessed = batch.solveArray(grids, box)
+        self.assertEqual(len(solutions), len(grids))
+        for grid, solution, ok in zip(grids, solutions, solved):
+            expected = self.solver.solve(grid)
+            if expected is None:
+                self.assertFalse(ok)
+                self.assertFalse(solution.any())
+            else:
+                self.assertTrue(ok)
+                self.assertEqual(solution.tolist(), flat(expected))
+        return guessed
+
+    def testSolvable(self):
+        grids = corpus('easy')[:30] + corpus('hard')[:20] + corpus('17clue')
+        guessed = self.check(grids)
+        # singles solve the easy ones, the solver gets the rest
+        self.assertTrue(0 < guessed < len(grids))
+
+    def testContradictory(self):
+        grids = [contradictory(grid) for grid in corpus('easy')[:10]]
+        grids.append(puzzles.parsePuzzle(DUPLICATE_HIDDEN_SINGLES))
+        self.check(grids)
+        solutions, solved, guessed = batch.solveArray(grids)
+        self.assertFalse(solved.any())
+
+    def testMixed(self):
+        easy = corpus('easy')[:10]
+        grids = easy[:5] + [contradictory(easy[5])] + corpus('hard')[:5] + \
+            [puzzles.parsePuzzle(DUPLICATE_HIDDEN_SINGLES)]
+        self.check(grids)
+
+    def testLargerBoard(self):
+        grids = [generator.Generator(seed, 4).generate('easy')
+                 for seed in range(3)]
+        self.check(grids, 4)
+
+    def testChunks(self):
+        grids = corpus('easy')[:20] + corpus('hard')[:10]
+        array = numpy.array([flat(grid) for grid in grids], dtype=numpy.uint8)
+        expected = batch.solveArray(array)[0]
+        out = numpy.zeros_like(array)
+        solved, guessed = batch.solveChunks(array, out, chunk=7)
+        self.assertEqual(solved, len(grids))
+        self.assertTrue((out == expected).all())
+
+
+@unittest.skipIf(numpy is None, 'needs numpy')
+class TextPuzzlesTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'puzzles.txt')
+        self.grids = corpus('easy')[:25]
+        self.lines = [puzzles.formatGrid(grid) for grid in self.grids]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, text):
+        file = open(self.path, 'w')
+        file.write(text)
+        file.close()
+
+    def testSlices(self):
+        self.write('\n'.join(self.lines) + '\n')
+        texts = batch.TextPuzzles(self.path)
+        self.assertTrue(texts.check())
+        self.assertEqual(len(texts), 25)
+        expected = numpy.array([flat(grid) for grid in self.grids],
+                               dtype=numpy.uint8)
+        self.assertTrue((texts[:] == expected).all())
+        self.assertTrue((texts[3:11] == expected[3:11]).all())
+        self.assertTrue((texts[20:40] == expected[20:]).all())
+        self.assertEqual(texts[4].tolist(), flat(self.grids[4]))
+        self.assertEqual(texts[-1].tolist(), flat(self.grids[-1]))
+        self.assertRaises(IndexError, texts.__getitem__, 25)
+        self.assertRaises(ValueError, texts.__getitem__, slice(0, 10, 2))
+
+    def testWithoutLastNewline(self):
+        self.write('\n'.join(self.lines))
+        texts = batch.TextPuzzles(self.path)
+        self.assertTrue(texts.check())
+        self.assertEqual(len(texts), 25)
+        self.assertEqual(texts[-1].tolist(), flat(self.grids[-1]))
+
+    def testCheck(self):
+        for lines in (['# a comment'] + self.lines,
+                      self.lines[:5] + [self.lines[5][:40] + 'x' +
+                                        self.lines[5][41:]] + self.lines[6:],
+                      self.lines[:5] + [self.lines[5] + '  7'] + self.lines[6:]):
+            self.write('\n'.join(lines) + '\n')
+            self.assertFalse(batch.TextPuzzles(self.path).check())
+
+    def testLoadText(self):
+        self.write('\n'.join(self.lines) + '\n')
+        self.assertIsInstance(batch.loadText(self.path), batch.TextPuzzles)
+        # other files are parsed line by line
+        self.write('# a comment\n' + '\n'.join(self.lines) + '\n')
+        grids = batch.loadText(self.path)
+        self.assertEqual(grids.tolist(), [flat(grid) for grid in self.grids])
+
+    def testWriteText(self):
+        solutions, solved, guessed = batch.solveArray(self.grids[:5] +
+            [contradictory(self.grids[5])])
+        batch.saveText(self.path, solutions, solved)
+        lines = open(self.path).read().splitlines()
+        solver = solvers.NativeSolver()
+        self.assertEqual(lines, [puzzles.formatGrid(solver.solve(grid))
+                                 for grid in self.grids[:5]] + ['none'])
+
+
+if __name__ == '__main__':
+    unittest.main()
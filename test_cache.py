@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the canonical form and the solution cache.
+
+    python -m unittest test_cache
+'''
+
+import random, unittest
+import solvers, puzzles
+from cache import canonicalize, CachedSolver, SolutionCache
+
+
+def corpus(name):
+    file = puzzles.openPuzzles('corpora/%s.txt' % name)
+    grids = [grid for number, grid in puzzles.readPuzzles(file)]
+    file.close()
+    return grids
+
+
+def shuffled(grid, rng):
+    '''
+    returns grid with relabeled digits, rows permuted within their band,
+    bands, columns within their stack, stacks, and maybe transposed
+    '''
+    def order():
+        bands = list(range(3))
+        rng.shuffle(bands)
+        lines = []
+        for b in bands:
+            inner = [b*3, b*3 + 1, b*3 + 2]
+            rng.shuffle(inner)
+            lines.extend(inner)
+        return lines
+    labels = list(range(1, 10))
+    rng.shuffle(labels)
+    labels.insert(0, 0)
+    rows, columns = order(), order()
+    if rng.random() < 0.5:
+        grid = [list(column) for column in zip(*grid)]
+    return [[labels[grid[r][c]] for c in columns] for r in rows]
+
+
+class CountingSolver(solvers.NativeSolver):
+    '''
+    counts the solves that reach the backend
+    '''
+    solves = 0
+    closed = False
+
+    def solve(self, grid):
+        self.solves += 1
+        return solvers.NativeSolver.solve(self, grid)
+
+    def close(self):
+        self.closed = True
+
+
+def isSolution(grid, solution):
+    if any(grid[r][c] and grid[r][c] != solution[r][c]
+           for r in range(9) for c in range(9)):
+        return False
+    units = [[solution[r][c] for c in range(9)] for r in range(9)] + \
+        [[solution[r][c] for r in range(9)] for c in range(9)] + \
+        [[solution[b//3*3 + i//3][b%3*3 + i%3] for i in range(9)]
+         for b in range(9)]
+    return all(sorted(unit) == list(range(1, 10)) for unit in units)
+
+
+class CanonicalizeTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(2)
+        self.grids = corpus('easy')[:20] + corpus('hard')[:20] + \
+            corpus('17clue')
+
+    def testInvariantUnderSymmetries(self):
+        for grid in self.grids:
+            key, transform = canonicalize(grid)
+            if key is None:
+                continue
+            for i in range(5):
+                self.assertEqual(canonicalize(shuffled(grid, self.rng))[0],
+                                 key)
+
+    def testForwardGivesKey(self):
+        for grid in self.grids:
+            key, transform = canonicalize(grid)
+            if key is not None:
+                self.assertEqual(bytes(transform.forward(grid)), key)
+
+    def testBackwardInvertsForward(self):
+        solver = solvers.NativeSolver()
+        for grid in self.grids:
+            key, transform = canonicalize(grid)
+            if key is None:
+                continue
+            solution = solver.solve(grid)
+            self.assertEqual(transform.backward(transform.forward(solution)),
+                             solution)
+
+    def testDifferentPuzzlesDifferentKeys(self):
+        keys = set(canonicalize(grid)[0] for grid in self.grids)
+        keys.discard(None)
+        self.assertEqual(len(keys), len([g for g in self.grids
+                                         if canonicalize(g)[0] is not None]))
+
+    def testOtherSizes(self):
+        grid = [[0] * 16 for r in range(16)]
+        self.assertEqual(canonicalize(grid), (None, None))
+
+
+class CachedSolverTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(3)
+        self.backend = CountingSolver()
+        self.solver = CachedSolver(self.backend, SolutionCache())
+
+    def testSolutionsOfEquivalentPuzzles(self):
+        for grid in corpus('hard')[:10]:
+            self.solver.solve(grid)
+            solves = self.backend.solves
+            for i in range(5):
+                variant = shuffled(grid, self.rng)
+                solution = self.solver.solve(variant)
+                self.assertTrue(isSolution(variant, solution))
+            # the variants were answered from the cache
+            self.assertEqual(self.backend.solves, solves)
+
+    def testNoSolutionIsCached(self):
+        grid = corpus('easy')[0]
+        row = grid[0]
+        # a digit twice in the first row
+        given = [c for c in range(9) if row[c]]
+        row[given[1]] = row[given[0]]
+        self.assertIsNone(self.solver.solve(grid))
+        solves = self.backend.solves
+        self.assertIsNone(self.solver.solve(shuffled(grid, self.rng)))
+        self.assertEqual(self.backend.solves, solves)
+
+    def testCloseClosesBackend(self):
+        self.solver.close()
+        self.assertTrue(self.backend.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the solver backends.
+
+    python -m unittest test_solvers
+'''
+
+import unittest
+import solvers, puzzles
+
+
+def corpus(name):
+    file = puzzles.openPuzzles('corpora/%s.txt' % name)
+    grids = [grid for number, grid in puzzles.readPuzzles(file)]
+    file.close()
+    return grids
+
+
+def isSolution(grid, solution, diagonal=False):
+    '''
+    returns True when solution keeps the givens of grid and has every
+    digit once in every unit (and diagonal)
+    '''
+    box = solvers.boxSize(grid)
+    L = solvers.layout(box)
+    cells = [d for row in solution for d in row]
+    if any(g and g != s for row, srow in zip(grid, solution)
+           for g, s in zip(row, srow)):
+        return False
+    units = list(L.units)
+    if diagonal:
+        units.append([i * (L.size + 1) for i in range(L.size)])
+        units.append([(i + 1) * (L.size - 1) for i in range(L.size)])
+    digits = list(range(1, L.size + 1))
+    return all(sorted(cells[i] for i in unit) == digits for unit in units)
+
+
+def bruteCount(grid, diagonal=False):
+    '''
+    counts the solutions of a small grid field by field
+    '''
+    size = len(grid)
+    cells = [d for row in grid for d in row]
+    solution = [row[:] for row in grid]
+
+    def count(i):
+        if i == len(cells):
+            return 1 if isSolution(grid, solution, diagonal) else 0
+        r, c = divmod(i, size)
+        if cells[i]:
+            return count(i + 1)
+        found = 0
+        for d in range(1, size + 1):
+            solution[r][c] = d
+            if d not in solution[r][:c] and \
+                    d not in [solution[k][c] for k in range(r)]:
+                found += count(i + 1)
+        solution[r][c] = 0
+        return found
+    return count(0)
+
+
+def links(matrix):
+    return (matrix.left[:], matrix.right[:], matrix.up[:], matrix.down[:],
+            matrix.count[:])
+
+
+class DLXSolverTest(unittest.TestCase):
+    def setUp(self):
+        self.solver = solvers.DLXSolver()
+        self.empty = [[0] * 4 for r in range(4)]
+
+    def testSolve(self):
+        for grid in corpus('easy')[:20] + corpus('hard')[:20] + \
+                corpus('pathological'):
+            self.assertTrue(isSolution(grid, self.solver.solve(grid)))
+
+    def testCount(self):
+        self.assertEqual(self.solver.count(self.empty), 288)
+        self.assertEqual(self.solver.count(self.empty), bruteCount(self.empty))
+        for limit in (1, 2, 5, 288):
+            self.assertEqual(self.solver.count(self.empty, limit), limit)
+        self.assertEqual(self.solver.count(self.empty, 1000), 288)
+        for grid in corpus('hard')[:10]:
+            self.assertEqual(self.solver.count(grid), 1)
+
+    def testCountOpenPuzzles(self):
+        # fewer givens, more solutions
+        native = solvers.NativeSolver()
+        for grid in corpus('hard')[:5]:
+            for r in range(3):
+                grid[r] = [0] * 9
+            found = self.solver.count(grid, 100)
+            self.assertTrue(found > 1)
+            self.assertEqual(found, native.count(grid, 100))
+            self.assertEqual(self.solver.count(grid, 2), 2)
+
+    def testSolutions(self):
+        found = list(self.solver.solutions(self.empty))
+        self.assertEqual(len(found), 288)
+        self.assertEqual(len(set(str(s) for s in found)), 288)
+        self.assertTrue(all(isSolution(self.empty, s) for s in found))
+
+    def testNoSolution(self):
+        grid = corpus('easy')[0]
+        row = grid[0]
+        given = [c for c in range(9) if row[c]]
+        row[given[1]] = row[given[0]]
+        self.assertIsNone(self.solver.solve(grid))
+        self.assertEqual(self.solver.count(grid), 0)
+
+    def testLinksRestoredAfterClose(self):
+        grid = corpus('hard')[0]
+        for r in range(3):
+            grid[r] = [0] * 9
+        expected = self.solver.count(grid)
+        matrix = self.solver.matrices[3]
+        before = links(matrix)
+        found = self.solver.solutions(grid)
+        next(found)
+        next(found)
+        found.close()
+        self.assertEqual(links(matrix), before)
+        self.assertFalse(matrix.busy)
+        self.assertEqual(self.solver.count(grid), expected)
+
+    def testLinksRestoredAfterCancel(self):
+        grid = corpus('17clue')[0]
+        expected = self.solver.solve(grid)
+        matrix = self.solver.matrices[3]
+        before = links(matrix)
+        found = self.solver.solutions(grid)
+        self.solver.cancel()
+        self.assertRaises(solvers.SolverCancelled, next, found)
+        self.assertEqual(links(matrix), before)
+        self.assertEqual(self.solver.solve(grid), expected)
+
+    def testOneSearchAtATime(self):
+        found = self.solver.solutions(self.empty)
+        next(found)
+        self.assertRaises(RuntimeError, self.solver.count, self.empty)
+        found.close()
+        self.assertEqual(self.solver.count(self.empty), 288)
+
+    def testDiagonal(self):
+        solver = solvers.DLXSolver(diagonal=True)
+        self.assertEqual(solver.count(self.empty),
+                         bruteCount(self.empty, True))
+        self.assertTrue(solver.count(self.empty) < 288)
+        for solution in solver.solutions(self.empty):
+            self.assertTrue(isSolution(self.empty, solution, True))
+        grid = [[0] * 9 for r in range(9)]
+        self.assertTrue(isSolution(grid, solver.solve(grid), True))
+        # the plain solution of a puzzle breaks the diagonals
+        grid = corpus('hard')[0]
+        solution = self.solver.solve(grid)
+        if not isSolution(grid, solution, True):
+            self.assertIsNone(solver.solve(grid))
+
+    def testInvalidDigit(self):
+        grid = [[0] * 9 for r in range(9)]
+        grid[4][4] = 10
+        self.assertRaises(ValueError, self.solver.solve, grid)
+
+
+if __name__ == '__main__':
+    unittest.main()
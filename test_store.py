@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the binary puzzle store.
+
+    python -m unittest test_store
+'''
+
+import os, random, shutil, tempfile, unittest
+import store
+from store import pack, unpack, cellBytes, StoreWriter, PuzzleStore
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def randomGrid(rng, box):
+    size = box * box
+    return [[rng.randint(0, size) for c in range(size)] for r in range(size)]
+
+
+class PackTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(4)
+
+    def testRoundTrip(self):
+        for box in (2, 3, 4, 5):
+            for i in range(20):
+                grid = randomGrid(self.rng, box)
+                data = pack(grid, box)
+                self.assertEqual(len(data), cellBytes(box))
+                self.assertEqual(unpack(data, box), grid)
+
+    def testExtremes(self):
+        for box in (2, 3, 4, 5):
+            size = box * box
+            for digit in (0, size):
+                grid = [[digit] * size for r in range(size)]
+                self.assertEqual(unpack(pack(grid, box), box), grid)
+
+
+class StoreTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(5)
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'test.sdb')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, box, flags, records):
+        writer = StoreWriter(self.path, box, flags)
+        for record in records:
+            writer.add(*record)
+        writer.close()
+
+    def testRecords(self):
+        flags = store.SOLUTION | store.DIFFICULTY | store.TIME
+        for box in (2, 3, 4):
+            records = [(randomGrid(self.rng, box), randomGrid(self.rng, box),
+                        self.rng.choice(('easy', 'medium', 'hard', None)),
+                        self.rng.random()) for i in range(30)]
+            records[3] = (records[3][0], None, None, None)
+            self.write(box, flags, records)
+            with PuzzleStore(self.path) as s:
+                self.assertEqual((s.box, s.flags, len(s)), (box, flags, 30))
+                for i, (grid, solution, level, seconds) in enumerate(records):
+                    self.assertEqual(s[i], grid)
+                    self.assertEqual(s.solution(i), solution)
+                    self.assertEqual(s.difficulty(i), level)
+                    self.assertAlmostEqual(s.seconds(i), seconds or 0.0,
+                                           places=5)
+                self.assertEqual(s[-1], records[-1][0])
+                self.assertRaises(IndexError, s.puzzle, 30)
+
+    def testWithoutFields(self):
+        grids = [randomGrid(self.rng, 3) for i in range(5)]
+        self.write(3, 0, [(grid,) for grid in grids])
+        with PuzzleStore(self.path) as s:
+            self.assertEqual(s.record_size, cellBytes(3))
+            self.assertEqual([s[i] for i in range(5)], grids)
+            self.assertIsNone(s.solution(0))
+            self.assertIsNone(s.difficulty(0))
+            self.assertIsNone(s.seconds(0))
+
+    def testTruncated(self):
+        self.write(3, 0, [(randomGrid(self.rng, 3),) for i in range(5)])
+        with open(self.path, 'r+b') as file:
+            file.truncate(os.path.getsize(self.path) - 1)
+        self.assertRaises(ValueError, PuzzleStore, self.path)
+
+    @unittest.skipIf(numpy is None, 'needs numpy')
+    def testSlices(self):
+        for box in (3, 4):
+            grids = [randomGrid(self.rng, box) for i in range(10)]
+            self.write(box, store.SOLUTION, [(grid, grid) for grid in grids])
+            s = PuzzleStore(self.path)
+            expected = numpy.array(grids, dtype=numpy.uint8).reshape(10, -1)
+            self.assertTrue((s[2:7] == expected[2:7]).all())
+            self.assertTrue((s.puzzles(0, 10, 'solution') == expected).all())
+            view = s[:]
+            s.close() # the view keeps the mapping alive
+            self.assertTrue((view == expected).all())
+
+
+if __name__ == '__main__':
+    unittest.main()